@@ -0,0 +1,271 @@
+import asyncio
+import json
+import os
+from collections import Counter
+
+import pytest
+
+from tools.github import benchmark, check_repos, check_repos_with_async, core
+from tools.github.http_cache import CachedResponse, HttpCache
+from tools.github.mock_server import MockGithubServer, repo_names
+from tools.github.rate_limit import RateLimitScheduler
+
+REPOS = {"octo": repo_names(250), "hubot": repo_names(30, "bot")}
+
+
+@pytest.fixture
+def github_api(monkeypatch, tmp_path):
+    """Serve the stand-in GitHub API on a local port."""
+    monkeypatch.setenv("GITHUB_TOKEN", "token")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with MockGithubServer(REPOS) as server:
+        monkeypatch.setattr(core.DetectorCore, "GITHUB_URL", server.url)
+        yield server
+
+
+def test_get_repos_all_pages(github_api):
+    """Test all pages of the listing are fetched."""
+    transport = check_repos.RequestsTransport()
+    repos = list(check_repos.GithubActionDetector("octo", transport).get_repos())
+    assert sorted(repo["name"] for repo in repos) == REPOS["octo"]
+
+
+def test_get_repos_all_pages_async(github_api):
+    """Test all pages of the listing are fetched with aiohttp."""
+
+    async def get_repos():
+        async with check_repos_with_async.AiohttpTransport() as transport:
+            client = check_repos_with_async.GithubActionDetector("octo", transport)
+            return [repo async for repo in client.get_repos()]
+
+    repos = asyncio.run(get_repos())
+    assert sorted(repo["name"] for repo in repos) == REPOS["octo"]
+
+
+@pytest.mark.parametrize(
+    "run", [check_repos.run_with_threads, check_repos_with_async.run_with_async]
+)
+@pytest.mark.parametrize(
+    "graphql_available, batch_size, posts, gets",
+    [
+        # 3 listing pages, then 5 GraphQL queries of 50 repositories
+        (True, 50, 5, 3),
+        # GraphQL failing, every batch falls back to one REST call per repository
+        (False, 50, 5, 253),
+        # GraphQL disabled
+        (True, 0, 0, 253),
+    ],
+)
+def test_run_reports_workflows(
+    github_api, capsys, run, graphql_available, batch_size, posts, gets
+):
+    """Test every repository of the user is checked for workflows."""
+    github_api.handler.graphql_available = graphql_available
+    result = run(type("Args", (), {"usernames": ["octo"], "batch_size": batch_size}))
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+    output = capsys.readouterr().out
+    assert output.count("has GitHub Actions") == 125
+    assert output.count("does not have GitHub Actions") == 125
+    assert github_api.requests == Counter(POST=posts, GET=gets)
+
+
+@pytest.mark.parametrize(
+    "run", [check_repos.run_with_threads, check_repos_with_async.run_with_async]
+)
+def test_run_falls_back_to_rest_for_failed_aliases(github_api, capsys, run):
+    """Test the repositories GraphQL could not look up are checked with REST."""
+    github_api.handler.graphql_errors = {"repo-001", "repo-002"}
+    result = run(type("Args", (), {"usernames": ["octo"], "batch_size": 50}))
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+    output = capsys.readouterr().out
+    assert output.count("has GitHub Actions") == 125
+    assert output.count("does not have GitHub Actions") == 125
+    # 3 listing pages, then a REST call for each of the 2 failed aliases
+    assert github_api.requests == Counter(POST=5, GET=5)
+
+
+@pytest.mark.parametrize(
+    "run", [check_repos.run_with_threads, check_repos_with_async.run_with_async]
+)
+def test_run_revalidates_cached_responses(github_api, capsys, run):
+    """Test a second run is answered with 304 Not Modified from the cache."""
+    args = type("Args", (), {"usernames": ["octo"], "batch_size": 0, "full": True})
+    for _ in range(2):
+        result = run(args)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+        output = capsys.readouterr().out
+        assert output.count("has GitHub Actions") == 125
+        assert output.count("does not have GitHub Actions") == 125
+
+    # 3 listing pages and 125 workflows directories, the 404s are not cached
+    assert github_api.requests == Counter(GET=506, **{"304": 128})
+
+
+@pytest.mark.parametrize(
+    "run", [check_repos.run_with_threads, check_repos_with_async.run_with_async]
+)
+def test_run_does_not_store_failed_checks(github_api, capsys, run):
+    """Test a check failing with another status than 200 or 404 is not recorded."""
+    args = type("Args", (), {"usernames": ["octo"], "batch_size": 0, "full": True})
+    for workflow_errors in ({}, {"repo-002": 500, "repo-003": 403}):
+        github_api.handler.workflow_errors = workflow_errors
+        result = run(args)
+        if asyncio.iscoroutine(result):
+            asyncio.run(result)
+
+    output = capsys.readouterr().out
+    assert "500 error for url" in output and "403 error for url" in output
+    assert "Changes since the last run" not in output
+
+
+@pytest.mark.parametrize(
+    "run", [check_repos.run_with_threads, check_repos_with_async.run_with_async]
+)
+def test_run_reports_the_rest_of_a_batch_when_a_repo_fails(github_api, capsys, run):
+    """Test a repository failing in the REST fallback does not stop its batch."""
+    github_api.handler.graphql_available = False
+    github_api.handler.workflow_errors = {"repo-002": 500}
+    args = {"usernames": ["octo"], "batch_size": 50, "no_store": True}
+    result = run(type("Args", (), args))
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+
+    output = capsys.readouterr().out
+    assert output.count("Error checking octo/repo-002: 500 error") == 1
+    assert output.count("has GitHub Actions") == 124
+    assert output.count("does not have GitHub Actions") == 125
+
+
+def test_http_cache_evicts_least_recently_used(tmp_path):
+    """Test the cache stays under its size limit by evicting the oldest entries."""
+    response = CachedResponse(200, "x" * 100, etag='"1"')
+    entry_size = len(json.dumps(response._asdict()))
+    cache = HttpCache(str(tmp_path), max_bytes=2 * entry_size)
+
+    assert cache.store("https://a", response)
+    assert cache.store("https://b", response)
+    os.utime(cache._path("https://a"), (0, 0))
+    os.utime(cache._path("https://b"), (1, 1))
+    assert cache.load("https://a") == response
+    assert cache.store("https://c", response)
+
+    assert cache.load("https://b") is None
+    assert cache.load("https://a") == response
+    assert cache.load("https://c").conditional_headers() == {"If-None-Match": '"1"'}
+    assert not cache.store("https://d", CachedResponse(200, "no validator"))
+    assert not cache.store("https://e", CachedResponse(404, "", etag='"2"'))
+
+
+@pytest.mark.parametrize(
+    "run", [check_repos.run_with_threads, check_repos_with_async.run_with_async]
+)
+def test_run_retries_throttled_requests(github_api, capsys, monkeypatch, run):
+    """Test throttled requests are retried with a bounded number in flight."""
+    monkeypatch.setattr("tools.github.rate_limit.BACKOFF_BASE", 0.01)
+    github_api.handler.throttle_every = 10
+    args = {
+        "usernames": ["octo"],
+        "batch_size": 0,
+        "no_cache": True,
+        "max_concurrency": 3,
+    }
+    result = run(type("Args", (), args))
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+
+    output = capsys.readouterr().out
+    assert output.count("has GitHub Actions") == 125
+    assert output.count("does not have GitHub Actions") == 125
+    # every 10th request is throttled, 253 requests succeed out of 281
+    assert github_api.requests == Counter(GET=281, **{"429": 28})
+    assert github_api.handler.in_flight["max"] <= 3
+
+
+def test_scheduler_adapts_concurrency(monkeypatch):
+    """Test the concurrency grows additively and is halved when throttled."""
+    monkeypatch.setattr("tools.github.rate_limit.BACKOFF_BASE", 0)
+    scheduler = RateLimitScheduler(max_concurrency=8)
+    assert scheduler.limit == 4
+
+    for _ in range(40):
+        assert scheduler.on_response(200, {}, 0) is None
+    assert scheduler.limit == 8
+
+    assert scheduler.on_response(429, {"Retry-After": "2"}, 0) == 2
+    assert scheduler.limit == 4
+    assert 1 < scheduler._wait_time() <= 2
+    assert scheduler.on_response(403, {}, 0, '{"message": "Forbidden"}') is None
+    body = '{"message": "You have exceeded a secondary rate limit."}'
+    assert scheduler.on_response(403, {}, 0, body) >= 60
+    assert scheduler.on_response(403, {}, scheduler.max_retries, body) is None
+    assert scheduler.on_response(502, {}, scheduler.max_retries) is None
+
+
+@pytest.mark.parametrize("batch_size", [0, 50])
+def test_run_with_async_pipelines_users(github_api, capsys, batch_size):
+    """Test the repositories of several users go through one bounded pipeline."""
+    args = {
+        "usernames": ["octo", "ghost", "hubot"],
+        "batch_size": batch_size,
+        "max_concurrency": 2,
+    }
+    asyncio.run(check_repos_with_async.run_with_async(type("Args", (), args)))
+
+    output = capsys.readouterr().out
+    assert output.count("octo/repo-") == 250
+    assert output.count("hubot/bot-") == 30
+    assert output.count("has GitHub Actions") == 140
+    assert "Error processing user ghost: 404" in output
+
+
+@pytest.mark.parametrize("batch_size", [0, 50])
+def test_run_with_threads_skips_failing_users(github_api, capsys, batch_size):
+    """Test a user whose listing fails is reported and the next users are checked."""
+    args = {"usernames": ["ghost", "octo"], "batch_size": batch_size}
+    check_repos.run_with_threads(type("Args", (), args))
+
+    output = capsys.readouterr().out
+    assert "Error processing user ghost: 404" in output
+    assert output.count("octo/repo-") == 250
+
+
+@pytest.mark.parametrize("mode", benchmark.MODES)
+def test_benchmark(mode):
+    """Test the benchmark checks every repository of the mock server."""
+    result = benchmark.run_benchmark(mode, 120, latency=0.001, max_concurrency=4)
+    assert result.requests == 122
+    assert result.throughput > 0
+    assert 0 < result.p50 <= result.p99
+
+
+@pytest.mark.parametrize("batch_size", [0, 50])
+@pytest.mark.parametrize(
+    "run", [check_repos.run_with_threads, check_repos_with_async.run_with_async]
+)
+def test_run_probes_only_pushed_repos(github_api, capsys, run, batch_size):
+    """Test only the repositories pushed to since the last run are checked again."""
+    args = type("Args", (), {"usernames": ["octo"], "batch_size": batch_size})
+    result = run(args)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+    capsys.readouterr()
+    github_api.requests.clear()
+
+    github_api.handler.pushed_at = {"repo-001": "2024-02-01T00:00:00Z"}
+    github_api.handler.has_actions = {"repo-001": True, "repo-003": True}
+    result = run(args)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+
+    output = capsys.readouterr().out
+    assert output.count("has GitHub Actions") == 126
+    assert output.count("does not have GitHub Actions") == 124
+    assert (
+        "Changes since the last run:\n  + octo/repo-001 gained GitHub Actions" in output
+    )
+    assert "repo-003 gained" not in output
+    # the 3 listing pages, then a single check
+    assert github_api.requests["GET"] + github_api.requests["POST"] == 4
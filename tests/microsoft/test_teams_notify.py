@@ -0,0 +1,241 @@
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tools.microsoft import coalescing, outbox
+from tools.microsoft.teams_notify import MSTeamNotification, notify_ms_teams
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """A stand-in for an incoming webhook, answering with the queued statuses first."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    statuses = []
+    received = []
+    latency = 0.0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        message = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+        with self.lock:
+            status = self.statuses.pop(0) if self.statuses else 200
+            if status == 200:
+                self.received.append(message)
+        body = b"1" if status == 200 else b"busy"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    """Serve the stand-in webhook on a local port."""
+    monkeypatch.setattr(WebhookHandler, "statuses", [])
+    monkeypatch.setattr(WebhookHandler, "received", [])
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WebhookHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/webhook"
+    server.shutdown()
+    server.server_close()
+
+
+def test_send_notification_retries(webhook, capsys):
+    """Test throttled and failed calls are retried until delivered."""
+    WebhookHandler.statuses = [429, 503]
+    with MSTeamNotification(webhook, backoff_factor=0) as notification:
+        message = notification.build_message(text="deployed")
+        assert notification.send_notification(message)
+
+    assert WebhookHandler.received == [message]
+    assert "Notification sent successfully" in capsys.readouterr().out
+
+
+def test_send_notification_gives_up(webhook, capsys):
+    """Test a webhook failing more than max_retries times is reported."""
+    WebhookHandler.statuses = [503] * 3
+    with MSTeamNotification(webhook, max_retries=2, backoff_factor=0) as notification:
+        assert not notification.send_notification(notification.build_message())
+    assert "status code: 503" in capsys.readouterr().out
+    assert WebhookHandler.statuses == []
+
+
+def test_send_notification_does_not_repost_after_read_timeout(
+    webhook, capsys, monkeypatch
+):
+    """Test a card the webhook is slow to acknowledge is not posted twice."""
+    monkeypatch.setattr(WebhookHandler, "latency", 0.3)
+    with MSTeamNotification(
+        webhook, timeout=(1, 0.1), max_retries=2, backoff_factor=0
+    ) as notification:
+        assert not notification.send_notification(notification.build_message())
+    time.sleep(0.6)
+    assert len(WebhookHandler.received) == 1
+
+
+def test_send_notification_times_out(webhook, capsys, monkeypatch):
+    """Test a slow webhook does not block the caller beyond the timeout."""
+    monkeypatch.setattr(WebhookHandler, "latency", 1.0)
+    with MSTeamNotification(webhook, timeout=(1, 0.1), max_retries=0) as notification:
+        assert not notification.send_notification(notification.build_message())
+    assert "Failed to send notification: " in capsys.readouterr().out
+
+
+def test_send_many_concurrently(webhook, monkeypatch):
+    """Test many notifications are flushed concurrently, in the background."""
+    monkeypatch.setattr(WebhookHandler, "latency", 0.1)
+    messages = [{"text": str(index)} for index in range(20)]
+
+    start = time.perf_counter()
+    with MSTeamNotification(webhook, workers=10) as notification:
+        future = notification.send_in_background({"text": "background"})
+        assert time.perf_counter() - start < 0.1
+        assert notification.send_many(messages) == [True] * 20
+    # 21 calls of 0.1s each on 10 workers
+    assert time.perf_counter() - start < 1
+    assert future.result()
+    assert len(WebhookHandler.received) == 21
+
+
+def test_notify_ms_teams_outbox(webhook, tmp_path, monkeypatch, capsys):
+    """Test --outbox spools the messages, which the daemon sends in batches."""
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path))
+    monkeypatch.setattr(outbox, "RETRY_BASE_SECONDS", 0)
+    argv = ["teams_notify.py", "-w", webhook, "-m", "one", "-m", "two", "--outbox"]
+    monkeypatch.setattr(sys, "argv", argv)
+    notify_ms_teams()
+    assert "Queued 2 notification(s)" in capsys.readouterr().out
+    assert WebhookHandler.received == []
+
+    spool = outbox.Outbox()
+    spool.put(webhook, {"text": "three"})
+    # the first call times out, without retry by the session, and is retried later
+    WebhookHandler.statuses = [408]
+    assert outbox.flush_outbox(spool, batch_size=2) == (3, 1, 0)
+    assert len(spool) == 0
+    assert sorted(m["text"] for m in WebhookHandler.received) == ["one", "three", "two"]
+
+
+def test_outbox_dead_letters(webhook, tmp_path, monkeypatch):
+    """Test rejected messages and those failing too often are not retried forever."""
+    monkeypatch.setattr(outbox, "RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(outbox, "MAX_ATTEMPTS", 2)
+    spool = outbox.Outbox(str(tmp_path / "outbox.sqlite"))
+    rejected = spool.put(webhook, {"text": "malformed"})
+    failing = spool.put(webhook, {"text": "timing out"})
+    WebhookHandler.statuses = [400, 408, 408]
+
+    assert outbox.flush_outbox(spool, batch_size=1) == (0, 1, 2)
+    assert len(spool) == 0
+    dead = [(item.id, item.attempts, status) for item, status in spool.dead_letters()]
+    assert dead == [(rejected, 1, 400), (failing, 2, 408)]
+
+
+def test_outbox_lease(tmp_path, monkeypatch):
+    """Test a claimed message is not lost when its daemon dies before the ack."""
+    spool = outbox.Outbox(str(tmp_path / "outbox.sqlite"))
+    item_id = spool.put("http://webhook", {"text": "deployed"})
+    assert [item.id for item in spool.claim()] == [item_id]
+
+    # another daemon, while the lease runs
+    other = outbox.Outbox(spool.path)
+    assert other.claim() == []
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + outbox.LEASE_SECONDS + 1)
+    assert other.claim() == [
+        outbox.OutboxItem(item_id, "http://webhook", {"text": "deployed"}, 0)
+    ]
+    other.ack([item_id])
+    assert len(spool) == 0
+
+
+def test_coalescing_notifier_dedups_and_combines(webhook):
+    """Test repeated notifications are dropped and a window is sent as one card."""
+    notification = MSTeamNotification(webhook)
+    with coalescing.CoalescingNotifier(notification, window=60) as notifier:
+        assert notifier.notify(title="build", text="failed")
+        assert not notifier.notify(title="build", text="failed")
+        for number in range(11):
+            assert notifier.notify(title="test", text=f"#{number}")
+    notification.close()
+    assert notifier.sent_cards == 2
+    first, second = WebhookHandler.received
+    assert first["summary"] == "10 notifications"
+    assert [section["text"] for section in first["sections"]][:2] == ["failed", "#0"]
+    assert [section["text"] for section in second["sections"]] == ["#9", "#10"]
+
+
+def test_coalescing_notifier_flushes_after_window(webhook):
+    """Test the queued notifications are sent once the window closes."""
+    with MSTeamNotification(webhook) as notification:
+        notifier = coalescing.CoalescingNotifier(notification, window=0.05)
+        notifier.notify(text="deployed")
+        time.sleep(0.5)
+        assert [message["text"] for message in WebhookHandler.received] == ["deployed"]
+        notifier.close()
+
+
+def test_coalescing_notifier_close_waits_for_timer_flush(webhook, monkeypatch):
+    """Test close returns only once the card the timer is sending has been sent."""
+    monkeypatch.setattr(WebhookHandler, "latency", 0.3)
+    with MSTeamNotification(webhook) as notification:
+        notifier = coalescing.CoalescingNotifier(notification, window=0.01)
+        notifier.notify(text="deployed")
+        time.sleep(0.1)
+        notifier.close()
+        assert notifier.sent_cards == 1
+    assert [message["text"] for message in WebhookHandler.received] == ["deployed"]
+
+
+def test_coalescing_notifier_resends_failed_notifications(webhook):
+    """Test a notification whose card was rejected is not dropped as a duplicate."""
+    WebhookHandler.statuses = [400]
+    with MSTeamNotification(webhook) as notification:
+        notifier = coalescing.CoalescingNotifier(notification, window=60)
+        assert notifier.notify(text="deployed")
+        notifier.flush()
+        assert notifier.sent_cards == 0
+        assert notifier.notify(text="deployed")
+        notifier.close()
+    assert notifier.sent_cards == 1
+    assert [message["text"] for message in WebhookHandler.received] == ["deployed"]
+
+
+def test_dedup_cache_expires_and_evicts(monkeypatch):
+    """Test keys are forgotten after the TTL, and the oldest beyond max_size."""
+    now = [100.0]
+    monkeypatch.setattr(coalescing.time, "monotonic", lambda: now[0])
+    cache = coalescing.DedupCache(ttl=10, max_size=2)
+    assert not cache.seen("a")
+    now[0] += 6
+    assert cache.seen("a")
+    # the TTL runs from the first time, not from the last one
+    now[0] += 5
+    assert not cache.seen("a")
+    cache.forget("a")
+    assert not cache.seen("a")
+    cache.seen("b")
+    cache.seen("c")
+    assert not cache.seen("a")
+
+
+def test_token_bucket_paces_bursts(monkeypatch):
+    """Test the bucket allows a burst, then one request per 1 / rate seconds."""
+    sleeps = []
+    monkeypatch.setattr(coalescing.time, "monotonic", lambda: 0.0)
+    monkeypatch.setattr(coalescing.time, "sleep", sleeps.append)
+    bucket = coalescing.TokenBucket(rate=2, capacity=3)
+    for _ in range(5):
+        bucket.acquire()
+    assert sleeps == [0.5, 1.0]
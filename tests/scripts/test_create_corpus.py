@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from tools.scripts import create_corpus
+from tools.scripts.file_searcher import FileSearcher
+from tools.scripts.init_creator import InitPyCreator
+
+SPEC = create_corpus.CorpusSpec(
+    seed=3, depth=2, fanout=2, files_per_dir=3, median_size=2048, density=0.05
+)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Generate a small corpus and return its root and manifest."""
+    root = str(tmp_path / "corpus")
+    return root, create_corpus.create_corpus(root, SPEC, workers=2)
+
+
+def test_corpus_is_reproducible(tmp_path, corpus):
+    """Test the same seed gives byte-identical files, and another seed does not."""
+    root, manifest = corpus
+    again = create_corpus.create_corpus(str(tmp_path / "again"), SPEC, workers=1)
+    assert again == manifest
+    assert create_corpus.verify_corpus(str(tmp_path / "again"), manifest) == []
+
+    other = create_corpus.create_corpus(str(tmp_path / "other"), SPEC._replace(seed=4))
+    assert other["files"] != manifest["files"]
+
+
+def test_corpus_shape(corpus):
+    """Test the tree has the requested depth, fan-out and files per directory."""
+    root, manifest = corpus
+    assert len(manifest["files"]) == (1 + 2 + 4) * 3
+    assert os.path.isdir(os.path.join(root, "d01", "d00"))
+    assert all(
+        os.path.getsize(os.path.join(root, entry["path"])) == entry["size"]
+        for entry in manifest["files"]
+    )
+
+
+def test_verify_corpus_detects_changes(corpus):
+    """Test a modified or missing file is reported."""
+    root, manifest = corpus
+    changed, removed = manifest["files"][0]["path"], manifest["files"][1]["path"]
+    with open(os.path.join(root, changed), "ab") as f:
+        f.write(b"x")
+    os.remove(os.path.join(root, removed))
+    assert create_corpus.verify_corpus(root, manifest) == [changed, removed]
+
+
+def test_file_searcher_finds_planted_matches(corpus):
+    """Test FileSearcher reports exactly the first planted match of every pattern."""
+    root, manifest = corpus
+    expected = create_corpus.first_matches(manifest)
+    assert expected
+    searcher = FileSearcher("*", list(SPEC.patterns), root)
+    found = {
+        (os.path.relpath(match.path, root), match.pattern): (
+            match.line_number,
+            match.offset,
+        )
+        for match in searcher.search()
+    }
+    assert found == expected
+
+
+def test_init_creator_fills_expected_dirs(corpus):
+    """Test InitPyCreator creates __init__.py in the directories of the manifest."""
+    root, manifest = corpus
+    InitPyCreator(root).create_init_files()
+    created = {
+        os.path.relpath(dirpath, root)
+        for dirpath, _, filenames in os.walk(root)
+        if "__init__.py" in filenames
+    }
+    assert created == {os.path.normpath(path) for path in manifest["init_dirs"]}
+
+
+@pytest.mark.parametrize("pattern", ["abc", "s t", "end\nstart"])
+def test_lowercase_pattern_is_rejected(tmp_path, pattern):
+    """Test a pattern the words of the text files could contain is refused."""
+    with pytest.raises(ValueError):
+        create_corpus.create_corpus(str(tmp_path), SPEC._replace(patterns=(pattern,)))
@@ -1,7 +1,9 @@
 import os
+import zlib
 
 import pytest
 
+from tools.scripts import create_random_files
 from tools.scripts.create_random_files import create_file, get_filename
 
 
@@ -31,3 +33,95 @@ def test_create_file(number, size):
     filename = get_filename(number)
     assert os.path.exists(filename)
     assert os.path.getsize(filename) == size
+
+
+@pytest.mark.parametrize("mode", ["random", "urandom", "zeros", "sparse"])
+def test_create_file_in_chunks(mode):
+    """Test every mode writes the exact size when it is not a multiple of the chunk."""
+    create_file(1, 10_000, mode, chunk_size=4096)
+    with open(get_filename(1), "rb") as f:
+        content = f.read()
+    assert len(content) == 10_000
+    assert (content == bytes(10_000)) == (mode in ("zeros", "sparse"))
+
+
+@pytest.mark.parametrize("compressibility", [0.0, 0.5, 0.9])
+def test_create_file_compressibility(compressibility):
+    """Test the zeroed fraction of every chunk sets how well the file compresses."""
+    create_file(1, 64 * 1024, compressibility=compressibility, chunk_size=8192)
+    with open(get_filename(1), "rb") as f:
+        ratio = len(zlib.compress(f.read())) / (64 * 1024)
+    assert ratio == pytest.approx(1 - compressibility, abs=0.05)
+
+
+def test_create_file_rejects_bad_compressibility():
+    """Test a compressibility out of [0, 1] is refused."""
+    with pytest.raises(ValueError):
+        create_file(1, 100, compressibility=1.5)
+
+
+@pytest.mark.parametrize("chunk_size", [0, -1])
+def test_create_file_rejects_bad_chunk_size(chunk_size):
+    """Test a chunk size below 1 is refused rather than looping forever."""
+    with pytest.raises(ValueError):
+        create_file(1, 100, chunk_size=chunk_size)
+
+
+def test_format_throughput():
+    """Test the size and the rate are reported in MB and MB/s."""
+    assert (
+        create_random_files.format_throughput(50_000_000, 2.0)
+        == "50.0 MB in 2.00 s (25.0 MB/s)"
+    )
+
+
+@pytest.mark.parametrize(
+    "number, files_per_dir, depth, expected",
+    [
+        (7, 1000, None, "file_0007.bin"),
+        (1234, 1000, None, "001/file_1234.bin"),
+        (1234567, 1000, None, "001/234/file_1234567.bin"),
+        (1234, 10, None, "1/2/3/file_1234.bin"),
+        (7, 1000, 2, "000/000/file_0007.bin"),
+        (1234, 1000, 2, "000/001/file_1234.bin"),
+    ],
+)
+def test_get_sharded_path(number, files_per_dir, depth, expected):
+    """Test the files are spread below directories of at most files_per_dir entries."""
+    result = create_random_files.get_sharded_path(number, files_per_dir, depth)
+    assert result == os.path.join(*expected.split("/"))
+
+
+@pytest.mark.parametrize("processes", [False, True])
+def test_create_files_bulk(tmp_path, capsys, processes):
+    """Test the bulk mode writes every file in its shard and reports the totals."""
+    result = create_random_files.create_files_bulk(
+        250, 100, output_dir=tmp_path, files_per_dir=100, workers=2, processes=processes
+    )
+    paths = [path for path in tmp_path.rglob("*") if path.is_file()]
+    assert len(paths) == 250
+    assert all(path.stat().st_size == 100 for path in paths)
+    assert (tmp_path / "02" / "file_0250.bin").exists()
+    assert result.files == 250 and result.bytes == 25_000
+    assert "250 files" in str(result)
+    assert "Created" not in capsys.readouterr().out
+
+
+def test_create_files_bulk_bounds_directories(tmp_path):
+    """Test no directory holds more than files_per_dir files and subdirectories."""
+    create_random_files.create_files_bulk(
+        250, 1, output_dir=tmp_path, files_per_dir=10, report_interval=0
+    )
+    entries = [len(dirs) + len(files) for _, dirs, files in os.walk(tmp_path)]
+    assert max(entries) == 10
+    assert not any(path.is_file() for path in tmp_path.iterdir())
+    assert (tmp_path / "2" / "5" / "file_0250.bin").exists()
+
+
+@pytest.mark.parametrize("files_per_dir", [0, 1])
+def test_create_files_bulk_rejects_small_directories(tmp_path, files_per_dir):
+    """Test fewer than 2 entries per directory can not shard the files."""
+    with pytest.raises(ValueError):
+        create_random_files.create_files_bulk(
+            10, 1, output_dir=tmp_path, files_per_dir=files_per_dir
+        )
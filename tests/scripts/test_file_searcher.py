@@ -0,0 +1,259 @@
+import io
+from datetime import datetime
+
+import pytest
+
+from tools.scripts.file_searcher import (
+    FileSearcher,
+    MultiPatternMatcher,
+    TrigramIndex,
+    search_buffer,
+    search_buffer_all,
+    search_stream,
+    search_stream_all,
+)
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        (b"foo\nbar needle baz\nqux", (8, 2, "bar needle baz")),
+        (b"needle", (0, 1, "needle")),
+        (b"no match here", None),
+    ],
+)
+def test_search_buffer(content, expected):
+    """Test search_buffer function."""
+    assert search_buffer(content, b"needle") == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4, 7, 1024])
+def test_search_stream_match_across_chunks(chunk_size):
+    """Test search_stream finds matches spanning chunk boundaries."""
+    content = b"first line\nsecond needle line\nthird"
+    result = search_stream(io.BytesIO(content), b"needle", chunk_size=chunk_size)
+    assert result[:2] == (18, 2)
+    assert "needle" in result[2]
+
+
+@pytest.mark.parametrize("chunk_size", [20, 24, 1024])
+def test_search_stream_reports_whole_line(chunk_size):
+    """Test search_stream reports the whole matching line."""
+    content = b"first line\nsecond needle line\nthird"
+    result = search_stream(io.BytesIO(content), b"needle", chunk_size=chunk_size)
+    assert result == (18, 2, "second needle line")
+
+
+def test_find_in_file_binary_and_mmap(tmp_path, monkeypatch):
+    """Test find_in_file on a non UTF-8 file with both read strategies."""
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(b"\xff\xfe\x00" * 1000 + b"\nlog: needle found\n")
+    searcher = FileSearcher("*.bin", "needle", str(tmp_path))
+
+    expected = {b"needle": (3006, 2, "log: needle found")}
+    assert searcher.find_in_file(str(file_path)) == expected
+
+    monkeypatch.setattr("tools.scripts.file_searcher.MMAP_THRESHOLD", 1)
+    assert searcher.find_in_file(str(file_path)) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1024])
+def test_long_lines_are_cut_around_the_match(tmp_path, monkeypatch, chunk_size):
+    """Test a match in a huge line is reported with a bounded context, by every path."""
+    content = b"x" * 100_000 + b"needle" + b"y" * 100_000 + b"\nnext"
+    expected = (100_000, 1, "x" * 256 + "needle" + "y" * 256)
+    assert search_buffer(content, b"needle") == expected
+    assert search_stream(io.BytesIO(content), b"needle", chunk_size) == expected
+
+    file_path = tmp_path / "huge.log"
+    file_path.write_bytes(content)
+    monkeypatch.setattr("tools.scripts.file_searcher.MMAP_THRESHOLD", 1)
+    searcher = FileSearcher("*.log", "needle", str(tmp_path))
+    assert searcher.find_in_file(str(file_path)) == {b"needle": expected}
+    # a short line is still reported whole
+    assert search_buffer(b"a needle\n" + content, b"needle") == (2, 1, "a needle")
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_search_files(tmp_path, capsys, workers, monkeypatch):
+    """Test search_files walks nested directories with a bounded queue."""
+    monkeypatch.setattr("tools.scripts.file_searcher.QUEUE_SIZE_PER_WORKER", 1)
+    for i in range(10):
+        nested = tmp_path.joinpath(*[f"dir_{j}" for j in range(i)])
+        nested.mkdir(parents=True, exist_ok=True)
+        (nested / f"match_{i}.log").write_text(f"line\nneedle {i}\n")
+        (nested / f"other_{i}.log").write_text("line\n")
+        (nested / f"match_{i}.txt").write_text("needle\n")
+
+    FileSearcher("*.log", "needle", str(tmp_path), workers=workers).search_files()
+
+    output = capsys.readouterr().out
+    assert output.count("last modified at") == 10
+    assert all(f"match_{i}.log" in output for i in range(10))
+
+
+def test_trigram_index(tmp_path, capsys):
+    """Test the trigram index narrows candidates and updates incrementally."""
+    (tmp_path / "a.log").write_text("alpha beta\n")
+    (tmp_path / "b.log").write_text("gamma delta\n")
+    index = TrigramIndex(str(tmp_path))
+
+    assert index.update() == 2
+    assert index.update() == 0
+    assert index.candidates(b"beta") == [str(tmp_path / "a.log")]
+
+    (tmp_path / "b.log").write_text("gamma beta\n")
+    (tmp_path / "a.log").unlink()
+    assert index.update() == 2
+    assert index.candidates(b"beta") == [str(tmp_path / "b.log")]
+
+    FileSearcher("*.log", "beta", str(tmp_path), index=index).search_files()
+    assert "b.log last modified at" in capsys.readouterr().out
+    index.close()
+
+
+def test_trigram_index_scans_changed_files_without_reindexing(tmp_path, capsys):
+    """Test changed and new files are scanned directly, the index is left as is."""
+    (tmp_path / "app.log").write_text("alpha\n")
+    (tmp_path / "notes.txt").write_text("beta\n")
+    index = TrigramIndex(str(tmp_path))
+    FileSearcher("*.log", "beta", str(tmp_path), index=index).search_files()
+    assert len(index) == 1  # only the files matching the name are indexed
+
+    with open(tmp_path / "app.log", "a") as log:
+        log.write("beta\n")
+    (tmp_path / "new.log").write_text("beta\n")
+    FileSearcher("*.log", "beta", str(tmp_path), index=index).search_files()
+    output = capsys.readouterr().out
+    assert "app.log" in output and "new.log" in output
+    assert index.candidates(b"beta") == []
+    assert len(index.changes("*.log")[0]) == 2
+    index.close()
+
+
+def test_trigram_index_skips_binary_files(tmp_path):
+    """Test binary files are not indexed but stay candidates of every search."""
+    (tmp_path / "data.bin").write_bytes(b"\x00\x01 beta")
+    index = TrigramIndex(str(tmp_path))
+    index.update()
+    assert index.candidates(b"gamma") == [str(tmp_path / "data.bin")]
+    index.close()
+
+
+def test_trigrams_skip_whitespace():
+    """Test trigrams spanning whitespace are neither indexed nor queried."""
+    expected = {int.from_bytes(trigram, "big") for trigram in (b"abc", b"bcd")}
+    assert TrigramIndex.trigrams(b"abcd ab\nabc") == expected
+
+
+def test_multi_pattern_matcher_reports_overlapping_patterns():
+    """Test the matcher reports the first offset of overlapping patterns."""
+    matcher = MultiPatternMatcher([b"he", b"she", b"his", b"hers", b"absent"])
+    assert matcher.search(b"ushers and his") == {
+        b"she": 1,
+        b"he": 2,
+        b"hers": 2,
+        b"his": 11,
+    }
+    assert matcher.search(b"ushers", wanted={b"she"}) == {b"she": 1}
+
+
+def test_multi_pattern_matcher_matches_find():
+    """Test the matcher agrees with bytes.find, with special and frequent patterns."""
+    content = b"a.b a.b a.b " * 100 + b"(x|y) [z]* a.b.c\n"
+    patterns = [b"a.b", b"a.b.c", b"(x|y)", b"[z]*", b"b ", b"", b"missing"]
+    matcher = MultiPatternMatcher(patterns)
+    matcher.REBUILD_AFTER_HITS = 2
+    expected = {p: content.find(p) for p in patterns if content.find(p) != -1}
+    assert matcher.search(content) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [12, 1024])
+@pytest.mark.parametrize("use_matcher", [False, True])
+def test_search_all_patterns(chunk_size, use_matcher):
+    """Test many patterns are matched in one pass over a buffer and a stream."""
+    content = b"one two\nthree four\nfive\n"
+    needles = [b"four", b"two", b"six", b"five"]
+    matcher = MultiPatternMatcher(needles) if use_matcher else None
+    expected = {
+        b"two": (4, 1, "one two"),
+        b"four": (14, 2, "three four"),
+        b"five": (19, 3, "five"),
+    }
+    assert search_buffer_all(content, needles, matcher) == expected
+    stream = io.BytesIO(content)
+    assert search_stream_all(stream, needles, chunk_size, matcher) == expected
+
+
+def test_search_files_many_patterns(tmp_path, capsys):
+    """Test search_files reports which patterns hit in which files."""
+    (tmp_path / "a.log").write_text("error: disk\nwarning: cpu\n")
+    (tmp_path / "b.log").write_text("info\n")
+
+    FileSearcher("*.log", ["warning", "error", "fatal"], str(tmp_path)).search_files()
+
+    output = capsys.readouterr().out
+    assert "a.log last modified at" in output
+    assert "  1 [error]: error: disk" in output
+    assert "  2 [warning]: warning: cpu" in output
+    assert "b.log" not in output
+
+
+def test_search_buffer_all_regex():
+    """Test regular expressions report the line of their first match."""
+    content = b"id=1\nuser: alice id=42\n"
+    assert search_buffer_all(content, [rb"id=\d{2}", rb"^user"], regex=True) == {
+        rb"^user": (5, 2, "user: alice id=42"),
+        rb"id=\d{2}": (17, 2, "user: alice id=42"),
+    }
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_search_files_process_mode(tmp_path, capsys, ordered):
+    """Test regex search in batches sent to a process pool."""
+    for i in range(20):
+        (tmp_path / f"file_{i:02}.log").write_text(f"header\nrequest took {i}ms\n")
+
+    FileSearcher(
+        "*.log",
+        r"took 1\dms",
+        str(tmp_path),
+        regex=True,
+        mode="process",
+        processes=2,
+        batch_size=3,
+        ordered=ordered,
+    ).search_files()
+
+    output = capsys.readouterr().out
+    assert output.count("last modified at") == 10
+    assert "  2: request took 15ms" in output
+
+
+def test_search_yields_results(tmp_path):
+    """Test search yields structured records ordered by offset within a file."""
+    (tmp_path / "a.log").write_text("warning: cpu\nerror: disk\n")
+
+    results = list(FileSearcher("*.log", ["error", "warning"], str(tmp_path)).search())
+
+    assert [(r.pattern, r.line_number, r.offset, r.line) for r in results] == [
+        ("warning", 1, 0, "warning: cpu"),
+        ("error", 2, 13, "error: disk"),
+    ]
+    assert all(r.path == str(tmp_path / "a.log") for r in results)
+    modified_time = datetime.fromtimestamp((tmp_path / "a.log").stat().st_mtime)
+    assert results[0].modified_time == modified_time
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_search_max_results(tmp_path, mode):
+    """Test search stops after max_results matches and cancels the pending work."""
+    for i in range(200):
+        (tmp_path / f"file_{i:03}.log").write_text("needle\n")
+    searcher = FileSearcher(
+        "*.log", "needle", str(tmp_path), workers=2, mode=mode, processes=2
+    )
+
+    assert len(list(searcher.search(max_results=3))) == 3
+    assert searcher._cancelled.is_set()
+    assert next(searcher.search(), None) is not None
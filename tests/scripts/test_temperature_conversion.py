@@ -1,5 +1,9 @@
+import array
+import io
+
 import pytest
 
+from tools.scripts import convert_temperature
 from tools.scripts.convert_temperature import TemperatureConverter
 
 
@@ -17,3 +21,89 @@ class TestTemperatureConverter:
     def test_fahrenheit_to_celsius(self, fahrenheit_temp, expected_celsius):
         converter = TemperatureConverter(fahrenheit_temp, "F")
         assert converter.to_celsius() == expected_celsius
+
+    @pytest.mark.parametrize(
+        "temperature, unit, target, expected",
+        [
+            (0, "C", "K", 273.15),
+            (0, "K", "R", 0),
+            (100, "C", "R", 671.67),
+            (0, "F", "K", 255.372),
+        ],
+    )
+    def test_kelvin_and_rankine(self, temperature, unit, target, expected):
+        converter = TemperatureConverter(temperature, unit)
+        assert converter.to(target) == pytest.approx(expected, abs=1e-3)
+
+
+def test_convert_batch_buffer():
+    """Test a buffer of doubles is converted in a single call."""
+    values = array.array("d", [0, 100, -40])
+    assert list(convert_temperature.convert_batch(values, "C", "F")) == [32, 212, -40]
+
+
+def test_convert_batch_honours_buffer_format():
+    """Test a buffer of other items than doubles is read with its own format."""
+    pytest.importorskip("numpy")
+    values = array.array("f", [0, 100])
+    assert list(convert_temperature.convert_batch(values, "C", "F")) == [32, 212]
+
+
+def test_convert_batch_numpy():
+    """Test a NumPy array is converted into a float64 array."""
+    np = pytest.importorskip("numpy")
+    result = convert_temperature.convert_batch(
+        np.array([32, 212], dtype=np.int32), "F", "K"
+    )
+    assert result.dtype == np.float64
+    assert result.tolist() == pytest.approx([273.15, 373.15])
+
+
+def test_convert_batch_rejects_unknown_unit():
+    """Test an unknown unit is refused."""
+    with pytest.raises(ValueError):
+        convert_temperature.convert_batch([1.0], "C", "X")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 8, 1024])
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        (b"0,100\n\n-40\n37.5", b"32.0,212.0\n\n-40.0\n99.5\n"),
+        # as many fields as lines, but not one per line: the blank line stays and
+        # the space separated values, not a number, are passed through
+        (b"0\n\n100 -40\n", b"32.0\n\n100 -40\n"),
+    ],
+)
+def test_convert_stream_keeps_layout(chunk_size, content, expected):
+    """Test CSV rows and blank lines are kept, whatever the chunk size."""
+    target = io.BytesIO()
+    convert_temperature.convert_stream(
+        io.BytesIO(content), target, "C", "F", precision=1, chunk_size=chunk_size
+    )
+    assert target.getvalue() == expected
+
+
+@pytest.mark.parametrize("numpy", [False, True])
+def test_convert_stream_passes_non_numeric_fields(monkeypatch, numpy):
+    """Test a CSV header and empty fields are kept as they are."""
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(convert_temperature, "_numpy", lambda: None)
+    target = io.BytesIO()
+    convert_temperature.convert_stream(
+        io.BytesIO(b"temp\n0\n1,,100\n"), target, "C", "F", precision=1
+    )
+    assert target.getvalue() == b"temp\n32.0\n33.8,,212.0\n"
+
+
+@pytest.mark.parametrize("precision", [0, 1, 3])
+def test_format_lines_matches_percent(precision):
+    """Test the vectorized formatting writes the values like % does."""
+    np = pytest.importorskip("numpy")
+    values = np.array(
+        [0.0, -0.0, 0.5, 1.5, -2.5, 0.125, 0.375, 99.95, -0.04, 123456.789, 1e-9]
+    )
+    expected = "".join(f"%.{precision}f\n" % value for value in values).encode()
+    assert convert_temperature._format_lines(values, precision) == expected
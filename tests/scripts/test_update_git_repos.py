@@ -0,0 +1,150 @@
+import csv
+import json
+import subprocess
+
+import pytest
+
+from tools.scripts.update_git_repos import GitRepositoryUpdater, percentile
+
+
+def git(*args, cwd):
+    """Run a git command in a directory."""
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """Create a workspace with clones of local bare repositories."""
+    monkeypatch.setattr(GitRepositoryUpdater, "_is_package_installed", lambda *_: True)
+    monkeypatch.setattr(GitRepositoryUpdater, "COMMANDS", ("git fetch origin --prune",))
+    remotes = tmp_path / "remotes"
+    clones = tmp_path / "workspace"
+    clones.mkdir()
+    for name in ("alpha", "beta", "gamma"):
+        git("init", "--bare", "-b", "main", str(remotes / name), cwd=tmp_path)
+        git("clone", str(remotes / name), name, cwd=clones)
+    return clones
+
+
+def test_sync_continues_after_failure(workspace):
+    """Test a broken repository does not abort the parallel sync."""
+    git("remote", "set-url", "origin", "/nonexistent", cwd=workspace / "beta")
+    updater = GitRepositoryUpdater(path=str(workspace))
+
+    failed = updater.sync(jobs=3)
+
+    assert len(updater.repos) == 3
+    assert failed == [str(workspace / "beta") + "/"]
+
+
+@pytest.mark.parametrize(
+    "nested, submodules, expected",
+    [
+        (False, False, ["outer/"]),
+        (True, False, ["outer/", "outer/inner/"]),
+        (True, True, ["outer/", "outer/inner/", "outer/sub/"]),
+    ],
+)
+def test_find_git_repos_pruning(tmp_path, monkeypatch, nested, submodules, expected):
+    """Test discovery prunes .git, excluded paths and repository working trees."""
+    monkeypatch.setattr(GitRepositoryUpdater, "_is_package_installed", lambda *_: True)
+    for repo in ("outer", "outer/inner", "outer/.terraform/module"):
+        (tmp_path / repo / ".git" / "objects").mkdir(parents=True)
+    (tmp_path / "outer" / "sub").mkdir()
+    (tmp_path / "outer" / "sub" / ".git").write_text("gitdir: ../.git/modules/sub")
+
+    updater = GitRepositoryUpdater(str(tmp_path), nested=nested, submodules=submodules)
+
+    assert sorted(updater.repos) == [str(tmp_path) + "/" + repo for repo in expected]
+
+
+def test_find_git_repos_cache(tmp_path, monkeypatch):
+    """Test the repository list is reused until a listed directory changes."""
+    monkeypatch.setattr(GitRepositoryUpdater, "_is_package_installed", lambda *_: True)
+    cache_file = str(tmp_path / "cache" / "repos.json")
+    root = tmp_path / "root"
+    (root / "alpha" / ".git").mkdir(parents=True)
+    assert GitRepositoryUpdater(str(root), cache_file=cache_file).repos == [
+        str(root / "alpha") + "/"
+    ]
+
+    discover = GitRepositoryUpdater._discover_git_repos
+    calls = []
+    monkeypatch.setattr(
+        GitRepositoryUpdater,
+        "_discover_git_repos",
+        lambda self, path: calls.append(path) or discover(self, path),
+    )
+    GitRepositoryUpdater(str(root), cache_file=cache_file)
+    assert calls == []
+
+    (root / "beta" / ".git").mkdir(parents=True)
+    updater = GitRepositoryUpdater(str(root), cache_file=cache_file)
+    assert calls == [str(root)]
+    assert sorted(updater.repos) == [
+        str(root / "alpha") + "/",
+        str(root / "beta") + "/",
+    ]
+
+
+def test_incremental_sync(workspace, tmp_path, monkeypatch):
+    """Test repositories are only updated when their remote refs changed."""
+    state_file = str(tmp_path / "state.json")
+    updated = []
+    run_command = GitRepositoryUpdater._run_command
+    monkeypatch.setattr(
+        GitRepositoryUpdater,
+        "_run_command",
+        lambda self, cmd, repo, msgs: updated.append(repo)
+        or run_command(self, cmd, repo, msgs),
+    )
+
+    assert GitRepositoryUpdater(str(workspace), state_file=state_file).sync() == []
+    assert len(updated) == 3
+
+    updated.clear()
+    assert GitRepositoryUpdater(str(workspace), state_file=state_file).sync() == []
+    assert updated == []
+
+    alpha = workspace / "alpha"
+    git(
+        "-c",
+        "user.name=t",
+        "-c",
+        "user.email=t@t",
+        "commit",
+        "--allow-empty",
+        "-m",
+        "x",
+        cwd=alpha,
+    )
+    git("push", "origin", "main", cwd=alpha)
+    assert GitRepositoryUpdater(str(workspace), state_file=state_file).sync() == []
+    assert updated == [str(alpha) + "/"]
+
+
+@pytest.mark.parametrize(
+    "percent, expected", [(50, 5), (90, 9), (99, 10), (100, 10), (1, 1)]
+)
+def test_percentile(percent, expected):
+    """Test nearest-rank percentiles."""
+    assert percentile(list(range(10, 0, -1)), percent) == expected
+
+
+def test_timing_report(workspace, tmp_path):
+    """Test every command is timed and written to JSON and CSV reports."""
+    updater = GitRepositoryUpdater(str(workspace))
+    updater.sync(jobs=2)
+
+    updater.write_report(str(tmp_path / "report.json"), slowest=2)
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert report["commands"]["git fetch origin --prune"]["count"] == 3
+    assert len(report["slowest"]) == 2
+    assert {span["repo"] for span in report["spans"]} == set(updater.repos)
+
+    updater.log_timing_summary(slowest=2)
+    updater.write_report(str(tmp_path / "report.csv"))
+    with open(tmp_path / "report.csv") as report_csv:
+        rows = list(csv.DictReader(report_csv))
+    assert len(rows) == 3
+    assert set(rows[0]) == {"repo", "command", "duration", "succeeded"}
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tools.cli import COMMANDS, main
+
+# Budgets of the cumulative import time of a command, in microseconds. They are a few
+# times the measured values, to catch regressions like importing pkg_resources.
+IMPORT_TIME_BUDGET = {
+    "tools.cli": 20_000,
+    "tools.scripts.file_searcher": 100_000,
+    "tools.scripts.update_git_repos": 100_000,
+    "tools.scripts.create_random_files": 60_000,
+    "tools.scripts.create_corpus": 60_000,
+    "tools.scripts.convert_temperature": 60_000,
+    "tools.scripts.init_creator": 60_000,
+    "tools.microsoft.teams_notify": 300_000,
+    "tools.microsoft.outbox": 300_000,
+    "tools.github.check_repos": 300_000,
+    "tools.github.check_repos_with_async": 500_000,
+    "tools.github.benchmark": 100_000,
+}
+
+
+def import_time(module: str) -> int:
+    """Return the cumulative cold import time of a module in microseconds.
+
+    The best of a few runs is taken, after a first run compiling the bytecode.
+    """
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": ""}
+    command = [sys.executable, "-X", "importtime", "-c", f"import {module}"]
+    timings = []
+    for _ in range(4):
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        line = [line for line in result.stderr.splitlines() if line.endswith(module)]
+        timings.append(int(line[-1].split("|")[1]))
+    return min(timings[1:])
+
+
+def test_commands_have_budget():
+    """Test every command module has an import time budget."""
+    assert {module for module, _, _ in COMMANDS.values()} <= set(IMPORT_TIME_BUDGET)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("module, budget", IMPORT_TIME_BUDGET.items())
+def test_import_time(module, budget):
+    """Test the cold start of the commands stays within budget."""
+    pytest.importorskip(module)
+    assert import_time(module) < budget
+
+
+def test_main_dispatches_to_command(capsys, monkeypatch):
+    """Test the arguments are passed to the selected command."""
+    monkeypatch.setattr(sys, "argv", sys.argv)
+    main(["convert-temperature", "-t", "100", "-u", "C"])
+    assert capsys.readouterr().out == "100.00°C = 212.00°F\n"
+
+
+@pytest.mark.parametrize("argv, code", [([], 0), (["--help"], 0), (["unknown"], 2)])
+def test_main_usage(capsys, argv, code):
+    """Test the list of commands is printed."""
+    assert main(argv) == code
+    assert "search" in capsys.readouterr().out
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Single entrypoint dispatching to the tools.
+
+Only the module of the selected tool is imported, so a command never pays the import
+cost of the dependencies of the other tools (requests, aiohttp, ...).
+"""
+import importlib
+import sys
+
+# command name: (module, entrypoint function, description)
+COMMANDS = {
+    "search": (
+        "tools.scripts.file_searcher",
+        "main",
+        "Find patterns in files recursively.",
+    ),
+    "sync-repos": (
+        "tools.scripts.update_git_repos",
+        "main",
+        "Update all Git repositories found below a directory.",
+    ),
+    "create-files": (
+        "tools.scripts.create_random_files",
+        "main",
+        "Create multiple files with a specified size.",
+    ),
+    "create-corpus": (
+        "tools.scripts.create_corpus",
+        "main",
+        "Generate a reproducible corpus of files and its manifest.",
+    ),
+    "convert-temperature": (
+        "tools.scripts.convert_temperature",
+        "main",
+        "Convert temperatures between Celsius, Fahrenheit, Kelvin and Rankine.",
+    ),
+    "init-files": (
+        "tools.scripts.init_creator",
+        "main",
+        "Recursively create __init__.py files in a directory.",
+    ),
+    "teams-notify": (
+        "tools.microsoft.teams_notify",
+        "notify_ms_teams",
+        "Send a notification message to MS Teams.",
+    ),
+    "teams-outbox": (
+        "tools.microsoft.outbox",
+        "main",
+        "Send the MS Teams notifications spooled with teams-notify --outbox.",
+    ),
+    "check-repos": (
+        "tools.github.check_repos",
+        "main",
+        "Check whether GitHub repositories have GitHub Actions.",
+    ),
+    "check-repos-async": (
+        "tools.github.check_repos_with_async",
+        "main",
+        "Check whether GitHub repositories have GitHub Actions, with asyncio.",
+    ),
+    "benchmark-checkers": (
+        "tools.github.benchmark",
+        "main",
+        "Benchmark the GitHub Actions checkers against a local mock API.",
+    ),
+}
+
+
+def print_usage():
+    """Print the list of available commands."""
+    print("usage: cli-tools <command> [options]\n\ncommands:")
+    for command, (_, _, description) in COMMANDS.items():
+        print(f"  {command:<22}{description}")
+    print("\nRun cli-tools <command> --help for the options of a command.")
+
+
+def main(argv: list = None):
+    """Run the tool selected by the first argument with the remaining arguments."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print_usage()
+        return 0
+
+    command, *args = argv
+    if command not in COMMANDS:
+        print(f"cli-tools: unknown command {command!r}\n", file=sys.stderr)
+        print_usage()
+        return 2
+
+    module_name, function_name, _ = COMMANDS[command]
+    sys.argv = [f"cli-tools {command}", *args]
+    module = importlib.import_module(module_name)
+    return getattr(module, function_name)()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
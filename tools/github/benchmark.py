@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Benchmark the threaded and asyncio detectors against the local mock GitHub API.
+
+Every combination of mode, repository count and concurrency checks the repositories
+of one user on a fresh mock server, without the HTTP cache and the status store, and
+reports the throughput in repositories per second and the p50/p99 latency of the HTTP
+requests.
+
+Example:
+    python -m tools.github.benchmark --repos 100 1000 --latency 0.05 --max-concurrency 8 32
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import statistics
+import time
+from typing import List, NamedTuple
+
+from tools.github import graphql
+from tools.github.mock_server import MockGithubServer, repo_names
+
+MODES = ("threads", "async")
+USERNAME = "benchmark"
+
+
+class BenchmarkResult(NamedTuple):
+    mode: str
+    repos: int
+    max_concurrency: int
+    requests: int
+    seconds: float
+    p50: float
+    p99: float
+
+    @property
+    def throughput(self) -> float:
+        """Return the checked repositories per second."""
+        return self.repos / self.seconds if self.seconds else 0.0
+
+
+def latency_percentiles(latencies: List[float]):
+    """Return the p50 and p99 of the latencies, 0 for no latencies."""
+    if len(latencies) < 2:
+        return (latencies[0], latencies[0]) if latencies else (0.0, 0.0)
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return cuts[49], cuts[98]
+
+
+def run_benchmark(
+    mode: str,
+    repos: int,
+    latency: float = 0.0,
+    max_concurrency: int = 16,
+    batch_size: int = 0,
+) -> BenchmarkResult:
+    """Check repos repositories with one mode of the detector and time it.
+
+    Args:
+        mode (str): threads or async.
+        repos (int): The number of repositories of the user.
+        latency (float): Seconds the mock server adds to every request.
+        max_concurrency (int): Upper bound of the requests in flight.
+        batch_size (int): Repositories per GraphQL query, 0 for one REST call each.
+    """
+    # imported here so that benchmarking one mode does not need the other's client
+    if mode == "threads":
+        from tools.github.check_repos import run_with_threads as run
+    else:
+        from tools.github.check_repos_with_async import run_with_async
+
+        def run(args):
+            return asyncio.run(run_with_async(args))
+
+    with MockGithubServer({USERNAME: repo_names(repos)}, latency) as server:
+        args = argparse.Namespace(
+            usernames=[USERNAME],
+            batch_size=batch_size,
+            no_cache=True,
+            no_store=True,
+            max_concurrency=max_concurrency,
+            api_url=server.url,
+            token="benchmark",  # noqa: S106
+        )
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies = run(args)
+        seconds = time.perf_counter() - start
+
+    p50, p99 = latency_percentiles(latencies)
+    return BenchmarkResult(
+        mode, repos, max_concurrency, len(latencies), seconds, p50, p99
+    )
+
+
+def print_results(results: List[BenchmarkResult]):
+    print(
+        f"{'mode':<8} {'repos':>6} {'conc.':>6} {'requests':>9} {'seconds':>8} "
+        f"{'repos/s':>9} {'p50 ms':>8} {'p99 ms':>8}"
+    )
+    for result in results:
+        print(
+            f"{result.mode:<8} {result.repos:>6} {result.max_concurrency:>6} "
+            f"{result.requests:>9} {result.seconds:>8.2f} {result.throughput:>9.1f} "
+            f"{result.p50 * 1000:>8.1f} {result.p99 * 1000:>8.1f}"
+        )
+
+
+def main():
+    """Main entrypoint."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the GitHub Actions detectors against a local mock API"
+    )
+    parser.add_argument(
+        "--modes", nargs="+", choices=MODES, default=list(MODES), help="Modes to run"
+    )
+    parser.add_argument(
+        "--repos", nargs="+", type=int, default=[100, 1000], help="Repository counts"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        nargs="+",
+        type=int,
+        default=[16],
+        help="Upper bounds of the requests in flight",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds added to every request by the mock server (default: 0.05)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help=f"Repositories per GraphQL query, e.g. {graphql.BATCH_SIZE}, 0 for REST only",
+    )
+    args = parser.parse_args()
+
+    results = [
+        run_benchmark(mode, repos, args.latency, max_concurrency, args.batch_size)
+        for mode, repos, max_concurrency in itertools.product(
+            args.modes, args.repos, args.max_concurrency
+        )
+    ]
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
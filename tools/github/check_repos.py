@@ -3,74 +3,179 @@
 
 import argparse
 import concurrent.futures
-import os
+import itertools
+import time
 
 import requests
+from requests.adapters import HTTPAdapter
 
-# ANSI escape codes for text color
-GREEN = "\033[32m"
-RESET = "\033[0m"
+from tools.github import core, graphql
+from tools.github.http_cache import CachedResponse
+from tools.github.rate_limit import MAX_CONCURRENCY, RateLimitScheduler
 
 
-class GithubActionDetector:
-    GITHUB_URL = "https://api.github.com"
+class RequestsTransport:
+    """Send the requests of a thread pool over one pooled requests session.
 
-    def __init__(self, username):
-        self.username = username
-        self.token = os.getenv("GITHUB_TOKEN")
-        if not self.token:
-            raise ValueError("Please set the GITHUB_TOKEN environment variable.")
-        self.headers = {"Authorization": f"token {self.token}"}
+    The connection pool holds as many connections as there are requests in flight,
+    so no thread ever waits for, or throws away, a connection.
+
+    Args:
+        max_concurrency (int): Upper bound of the requests in flight.
+        token (str): The GitHub token, GITHUB_TOKEN by default.
+    """
+
+    errors = (requests.RequestException,)
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, token: str = None):
+        self.scheduler = RateLimitScheduler(max_concurrency)
         self.session = requests.Session()
-        self.session.headers.update(self.headers)
+        self.session.headers["Authorization"] = f"token {core.get_token(token)}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.latencies = []
+
+    def request(self, method, url, **kwargs) -> CachedResponse:
+        """Send a request through the scheduler, retrying the throttled and failed ones."""
+        for attempt in itertools.count():
+            with self.scheduler.slot():
+                start = time.perf_counter()
+                response = self.session.request(method, url, **kwargs)
+                self.latencies.append(time.perf_counter() - start)
+            delay = self.scheduler.on_response(
+                response.status_code, response.headers, attempt, response.text
+            )
+            if delay is None:
+                return CachedResponse(
+                    response.status_code,
+                    response.text,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    response.headers.get("Link"),
+                )
+            time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+class GithubActionDetector(core.DetectorCore):
+    PAGE_WORKERS = 8
 
     def get_repos(self):
-        url = f"{self.GITHUB_URL}/users/{self.username}/repos"
-        repos = self.session.get(url).json()
-        return repos
+        """Yield all repositories of the user as the listing pages arrive.
+
+        The first page tells the number of the last page in its Link header, the
+        remaining pages are then fetched concurrently.
+        """
+        response = self._get(self.page_url(1), raise_for_status=True)
+        yield from response.json()
+
+        last_page = self._last_page(response.links)
+        with concurrent.futures.ThreadPoolExecutor(self.PAGE_WORKERS) as executor:
+            futures = [
+                executor.submit(self._get, self.page_url(page), True)
+                for page in range(2, last_page + 1)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                yield from future.result().json()
+
+    def _get(self, url, raise_for_status=False):
+        """GET a URL, revalidating the cached response when there is one."""
+        cached, headers = self.revalidation(url)
+        response = self.transport.request("GET", url, headers=headers)
+        return self.revalidated(url, cached, response, raise_for_status)
 
     def check_workflow(self, repo):
-        repo_name = repo["name"]
-        repo_url = f"{self.GITHUB_URL}/repos/{self.username}/{repo_name}"
-        repo_response = self.session.get(repo_url).json()
-        default_branch = repo_response["default_branch"]
-        url = f"{self.GITHUB_URL}/repos/{self.username}/{repo_name}/contents/.github/workflows?ref={default_branch}"
-        response = self.session.get(url)
-        if response.ok:
-            print(f"{GREEN}{self.username}/{repo_name} has GitHub Actions{RESET}")
-        else:
-            print(f"{self.username}/{repo_name} does not have GitHub Actions")
+        """Check a single repository with the REST API."""
+        url = self.workflow_url(repo)
+        self.report_workflows(repo, url, self._get(url))
+
+    def check_workflows(self, repos):
+        """Check a batch of repositories with one GraphQL query, falling back to REST."""
+        url, payload = self.graphql_request(repos)
+        try:
+            response = self.transport.request("POST", url, json=payload)
+            results = self.workflows_results(response, repos)
+        except self.transport.errors:
+            results = None
+
+        unchecked = repos if results is None else self.report_all(repos, results)
+        errors = (core.GithubAPIError, *self.transport.errors)
+        for repo in unchecked:
+            # one failing repository does not keep the rest of the batch unchecked
+            try:
+                self.check_workflow(repo)
+            except errors as exc:
+                self.report_error(repo, exc)
 
 
 def run_with_threads(args):
-    for username in args.usernames:
-        client = GithubActionDetector(username)
-        user_repos = client.get_repos()
-
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = []
+    """Check the repositories of every user on a thread pool.
+
+    Returns:
+        list: The duration of every HTTP request, in seconds.
+    """
+    batch_size = getattr(args, "batch_size", graphql.BATCH_SIZE)
+    cache = core.make_cache(args)
+    store = core.make_store(args)
+    full = getattr(args, "full", False)
+    max_concurrency = getattr(args, "max_concurrency", MAX_CONCURRENCY)
+    transport = RequestsTransport(max_concurrency, getattr(args, "token", None))
+    listing_errors = (core.GithubAPIError, *transport.errors)
+    try:
+        for username in args.usernames:
+            client = GithubActionDetector(
+                username, transport, cache, getattr(args, "api_url", None), store
+            )
+
+            with concurrent.futures.ThreadPoolExecutor(max_concurrency) as executor:
+                futures = []
+                batch = []
 
-            for repo in user_repos:
-                future = executor.submit(client.check_workflow, repo)
-                futures.append(future)
-
-            for future in concurrent.futures.as_completed(futures):
                 try:
-                    future.result()
-                except Exception as exc:
-                    print(f"Error processing user: {exc}")
-
-
-if __name__ == "__main__":
+                    for repo in client.get_repos():
+                        if not full and client.is_unchanged(repo):
+                            continue
+                        if not batch_size:
+                            futures.append(executor.submit(client.check_workflow, repo))
+                            continue
+                        batch.append(repo)
+                        if len(batch) == batch_size:
+                            futures.append(
+                                executor.submit(client.check_workflows, batch)
+                            )
+                            batch = []
+                except listing_errors as exc:
+                    # the repositories listed so far are still checked
+                    print(f"Error processing user {username}: {exc}")
+                if batch:
+                    futures.append(executor.submit(client.check_workflows, batch))
+
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        print(f"Error processing user: {exc}")
+    finally:
+        transport.close()
+        if store:
+            store.close()
+    core.print_changes(store)
+    return transport.latencies
+
+
+def main():
+    """Main entrypoint."""
     parser = argparse.ArgumentParser(
         description="Check if GitHub user/org repositories have GitHub Actions"
     )
-    parser.add_argument(
-        "usernames",
-        nargs="+",
-        type=str,
-        help="The username(s)/org name(s) on GitHub",
-    )
+    core.add_arguments(parser)
     args = parser.parse_args()
 
     run_with_threads(args)
+
+
+if __name__ == "__main__":
+    main()
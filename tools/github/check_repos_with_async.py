@@ -3,72 +3,218 @@
 
 import argparse
 import asyncio
-import os
+import itertools
+import time
 
 import aiohttp
 
-# ANSI escape codes for text color
-GREEN = "\033[32m"
-RESET = "\033[0m"
+from tools.github import core, graphql
+from tools.github.http_cache import CachedResponse
+from tools.github.rate_limit import MAX_CONCURRENCY, AsyncRateLimitScheduler
 
+DNS_CACHE_SECONDS = 300
 
-class GithubActionDetector:
-    GITHUB_URL = "https://api.github.com"
 
-    def __init__(self, username, session):
-        self.username = username
-        self.token = os.getenv("GITHUB_TOKEN")
-        if not self.token:
-            raise ValueError("Please set the GITHUB_TOKEN environment variable.")
-        self.headers = {"Authorization": f"token {self.token}"}
-        self.session = session
+class AiohttpTransport:
+    """Send the requests of the event loop over one aiohttp session.
 
+    The connector keeps as many connections open as there are requests in flight and
+    caches the DNS lookups. Use it as an async context manager, which opens and closes
+    the session.
+
+    Args:
+        max_concurrency (int): Upper bound of the requests in flight.
+        token (str): The GitHub token, GITHUB_TOKEN by default.
+    """
+
+    errors = (aiohttp.ClientError, asyncio.TimeoutError)
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, token: str = None):
+        self.max_concurrency = max_concurrency
+        self.scheduler = AsyncRateLimitScheduler(max_concurrency)
+        self.headers = {"Authorization": f"token {core.get_token(token)}"}
+        self.session = None
+        self.latencies = []
+
+    async def __aenter__(self):
+        """Open the session."""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency, ttl_dns_cache=DNS_CACHE_SECONDS
+        )
+        self.session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        """Close the session."""
+        await self.session.close()
+
+    async def request(self, method, url, **kwargs) -> CachedResponse:
+        """Send a request through the scheduler, retrying the throttled and failed ones."""
+        for attempt in itertools.count():
+            async with self.scheduler.slot():
+                start = time.perf_counter()
+                async with self.session.request(method, url, **kwargs) as response:
+                    body = await response.text()
+                self.latencies.append(time.perf_counter() - start)
+            delay = self.scheduler.on_response(
+                response.status, response.headers, attempt, body
+            )
+            if delay is None:
+                return CachedResponse(
+                    response.status,
+                    body,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    response.headers.get("Link"),
+                )
+            await asyncio.sleep(delay)
+
+
+class GithubActionDetector(core.DetectorCore):
     async def get_repos(self):
-        url = f"{self.GITHUB_URL}/users/{self.username}/repos"
-        async with self.session.get(url) as response:
-            repos = await response.json()
-        return repos
+        """Yield all repositories of the user as the listing pages arrive.
+
+        The first page tells the number of the last page in its Link header, the
+        remaining pages are then fetched concurrently.
+        """
+        response = await self._get(self.page_url(1), raise_for_status=True)
+        for repo in response.json():
+            yield repo
+
+        last_page = self._last_page(response.links)
+        pages = [
+            self._get(self.page_url(page), True) for page in range(2, last_page + 1)
+        ]
+        for page in asyncio.as_completed(pages):
+            for repo in (await page).json():
+                yield repo
+
+    async def _get(self, url, raise_for_status=False):
+        """GET a URL, revalidating the cached response when there is one."""
+        cached, headers = self.revalidation(url)
+        response = await self.transport.request("GET", url, headers=headers)
+        return self.revalidated(url, cached, response, raise_for_status)
 
     async def check_workflow(self, repo):
-        repo_name = repo["name"]
-        repo_url = f"{self.GITHUB_URL}/repos/{self.username}/{repo_name}"
-        async with self.session.get(repo_url) as repo_response:
-            repo_data = await repo_response.json()
-        default_branch = repo_data["default_branch"]
-        url = f"{self.GITHUB_URL}/repos/{self.username}/{repo_name}/contents/.github/workflows?ref={default_branch}"
-        async with self.session.get(url) as workflow_response:
-            if workflow_response.ok:
-                print(f"{GREEN}{self.username}/{repo_name} has GitHub Actions{RESET}")
-            else:
-                print(f"{self.username}/{repo_name} does not have GitHub Actions")
+        """Check a single repository with the REST API."""
+        url = self.workflow_url(repo)
+        self.report_workflows(repo, url, await self._get(url))
+
+    async def check_workflows(self, repos):
+        """Check a batch of repositories with one GraphQL query, falling back to REST."""
+        url, payload = self.graphql_request(repos)
+        try:
+            response = await self.transport.request("POST", url, json=payload)
+            results = self.workflows_results(response, repos)
+        except self.transport.errors:
+            results = None
+
+        unchecked = repos if results is None else self.report_all(repos, results)
+        # one failing repository does not cancel the checks of the rest of the batch
+        checks = await asyncio.gather(
+            *(self.check_workflow(repo) for repo in unchecked), return_exceptions=True
+        )
+        for repo, result in zip(unchecked, checks):
+            if isinstance(result, Exception):
+                self.report_error(repo, result)
+
+
+async def enqueue_checks(client, queue, batch_size, full=False):
+    """List the repositories of a user and queue their checks as the pages arrive.
+
+    Unless full is set, the repositories not pushed to since their last check are
+    reported from the status store instead.
+    """
+    batch = []
+    async for repo in client.get_repos():
+        if not full and client.is_unchanged(repo):
+            continue
+        if not batch_size:
+            await queue.put(client.check_workflow(repo))
+            continue
+        batch.append(repo)
+        if len(batch) == batch_size:
+            await queue.put(client.check_workflows(batch))
+            batch = []
+    if batch:
+        await queue.put(client.check_workflows(batch))
+
+
+async def check_worker(queue):
+    """Run the queued checks one after the other, forever."""
+    while True:
+        check = await queue.get()
+        try:
+            await check
+        except Exception as exc:
+            print(f"Error processing user: {exc}")
+        finally:
+            queue.task_done()
 
 
 async def run_with_async(args):
-    async with aiohttp.ClientSession(
-        headers={"Authorization": f"token {os.getenv('GITHUB_TOKEN')}"}
-    ) as session:
-        tasks = []
-        for username in args.usernames:
-            client = GithubActionDetector(username, session)
-            user_repos = await client.get_repos()
+    """Check the repositories of all users in a producer/consumer pipeline.
 
-            for repo in user_repos:
-                task = asyncio.create_task(client.check_workflow(repo))
-                tasks.append(task)
+    The listings of all users are fetched concurrently and feed a bounded queue of
+    checks, drained by a fixed pool of workers, so the memory stays constant however
+    many repositories there are.
 
-        await asyncio.gather(*tasks)
+    Returns:
+        list: The duration of every HTTP request, in seconds.
+    """
+    batch_size = getattr(args, "batch_size", graphql.BATCH_SIZE)
+    cache = core.make_cache(args)
+    store = core.make_store(args)
+    max_concurrency = getattr(args, "max_concurrency", MAX_CONCURRENCY)
+    token = getattr(args, "token", None)
+    try:
+        async with AiohttpTransport(max_concurrency, token) as transport:
+            queue = asyncio.Queue(maxsize=2 * max_concurrency)
+            workers = [
+                asyncio.create_task(check_worker(queue)) for _ in range(max_concurrency)
+            ]
 
+            producers = [
+                enqueue_checks(
+                    GithubActionDetector(
+                        username,
+                        transport,
+                        cache,
+                        getattr(args, "api_url", None),
+                        store,
+                    ),
+                    queue,
+                    batch_size,
+                    getattr(args, "full", False),
+                )
+                for username in args.usernames
+            ]
+            results = await asyncio.gather(*producers, return_exceptions=True)
+            for username, result in zip(args.usernames, results):
+                if isinstance(result, Exception):
+                    print(f"Error processing user {username}: {result}")
 
-if __name__ == "__main__":
+            await queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    finally:
+        if store:
+            store.close()
+    core.print_changes(store)
+    return transport.latencies
+
+
+def main():
+    """Main entrypoint."""
     parser = argparse.ArgumentParser(
         description="Check if GitHub user/org repositories have GitHub Actions"
     )
-    parser.add_argument(
-        "usernames",
-        nargs="+",
-        type=str,
-        help="The username(s)/org name(s) on GitHub",
-    )
+    core.add_arguments(parser)
     args = parser.parse_args()
 
     asyncio.run(run_with_async(args))
+
+
+if __name__ == "__main__":
+    main()
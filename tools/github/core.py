@@ -0,0 +1,257 @@
+"""Transport independent core of the GitHub Actions detectors.
+
+The detector of check_repos.py runs on a thread pool over requests, the one of
+check_repos_with_async.py on asyncio over aiohttp. Everything but sending the requests
+lives here: the URLs, the revalidation against the HTTP cache, the GraphQL batches,
+the parsing of the responses and the report. A transport only has to turn a request
+into a CachedResponse, going through its rate-limit scheduler.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from tools.github import graphql
+from tools.github.http_cache import CachedResponse, HttpCache
+from tools.github.rate_limit import MAX_CONCURRENCY
+from tools.github.status_store import WorkflowStatusStore
+
+# ANSI escape codes for text color
+GREEN = "\033[32m"
+RESET = "\033[0m"
+
+DEFAULT_CACHE_MB = 64
+
+
+class GithubAPIError(Exception):
+    """A request to the GitHub API failed with an error status."""
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"{status} error for url: {url}")
+        self.status = status
+
+
+def get_token(token: str = None) -> str:
+    """Return the token to authenticate with, GITHUB_TOKEN by default."""
+    token = token or os.getenv("GITHUB_TOKEN")
+    if not token:
+        raise ValueError("Please set the GITHUB_TOKEN environment variable.")
+    return token
+
+
+class DetectorCore:
+    """The requests and responses of a detector, without doing any I/O.
+
+    Args:
+        username (str): The user or organization whose repositories are checked.
+        transport: Sends the requests, see RequestsTransport and AiohttpTransport.
+        cache (HttpCache): Revalidates the GET responses, None to disable.
+        api_url (str): The root of the GitHub API, GITHUB_URL by default.
+        store (WorkflowStatusStore): Skips the repositories not pushed to since their
+            last check, None to check them all.
+    """
+
+    GITHUB_URL = "https://api.github.com"
+    PER_PAGE = 100
+
+    def __init__(
+        self,
+        username,
+        transport,
+        cache: HttpCache = None,
+        api_url=None,
+        store: WorkflowStatusStore = None,
+    ):
+        self.username = username
+        self.transport = transport
+        self.cache = cache
+        self.api_url = api_url or self.GITHUB_URL
+        self.store = store
+
+    def page_url(self, page: int) -> str:
+        params = {"per_page": self.PER_PAGE, "page": page}
+        return f"{self.api_url}/users/{self.username}/repos?{urlencode(params)}"
+
+    def workflow_url(self, repo: dict) -> str:
+        return (
+            f"{self.api_url}/repos/{self.username}/{repo['name']}"
+            f"/contents/{graphql.WORKFLOWS_PATH}?ref={repo['default_branch']}"
+        )
+
+    def graphql_request(self, repos: List[dict]) -> Tuple[str, dict]:
+        """Return the URL and the payload of the query checking a batch of repos."""
+        query = graphql.build_workflows_query(self.username, repos)
+        return f"{self.api_url}/graphql", {"query": query}
+
+    def revalidation(self, url: str) -> Tuple[Optional[CachedResponse], dict]:
+        """Return the cached response of a URL and the headers revalidating it."""
+        cached = self.cache.load(url) if self.cache else None
+        return cached, cached.conditional_headers() if cached else {}
+
+    def revalidated(
+        self,
+        url: str,
+        cached: Optional[CachedResponse],
+        response: CachedResponse,
+        raise_for_status: bool = False,
+    ) -> CachedResponse:
+        """Return the response of a GET, or the cached one when it was not modified."""
+        if cached and response.status == 304:
+            return cached
+        if raise_for_status and not response.ok:
+            raise GithubAPIError(response.status, url)
+        if self.cache:
+            self.cache.store(url, response)
+        return response
+
+    @staticmethod
+    def _last_page(links):
+        """Return the number of the last page from the parsed Link header."""
+        last_url = links.get("last", {}).get("url")
+        if not last_url:
+            return 1
+        return int(parse_qs(urlparse(str(last_url)).query).get("page", ["1"])[0])
+
+    @staticmethod
+    def workflows_results(
+        response: CachedResponse, repos: List[dict]
+    ) -> Optional[Dict[str, bool]]:
+        """Return the results of a GraphQL batch, None when REST must be used instead."""
+        if not response.ok:
+            return None
+        try:
+            payload = response.json()
+        except ValueError:
+            return None
+        return graphql.parse_workflows_response(payload, repos)
+
+    def is_unchanged(self, repo: dict) -> bool:
+        """Print the stored status of a repository not pushed to since its last check.
+
+        Returns:
+            bool: Whether the stored status was used and the repository needs no check.
+        """
+        has_actions = self.store.unchanged(self.username, repo) if self.store else None
+        if has_actions is None:
+            return False
+        self.print_status(repo["name"], has_actions)
+        return True
+
+    def report_workflows(self, repo: dict, url: str, response: CachedResponse):
+        """Report a repository from the response of its workflows directory.
+
+        Only a 200 or a 404 tells whether the directory exists: any other status, a
+        server error or a request still throttled after its retries, is raised rather
+        than stored as a repository without GitHub Actions.
+        """
+        if response.status not in (200, 404):
+            raise GithubAPIError(response.status, url)
+        self.report(repo, response.status == 200)
+
+    def report_error(self, repo: dict, exc: Exception):
+        """Print why a repository could not be checked, its status is left as it was."""
+        print(f"Error checking {self.username}/{repo['name']}: {exc}")
+
+    def report(self, repo: dict, has_actions: bool):
+        """Print the status of a checked repository and store it."""
+        if self.store:
+            self.store.record(self.username, repo, has_actions)
+        self.print_status(repo["name"], has_actions)
+
+    def report_all(self, repos: List[dict], results: Dict[str, bool]) -> List[dict]:
+        """Report the repositories of a GraphQL batch.
+
+        Returns:
+            List[dict]: The repositories without a result, to check with REST instead.
+        """
+        unchecked = []
+        for repo in repos:
+            if repo["name"] in results:
+                self.report(repo, results[repo["name"]])
+            else:
+                unchecked.append(repo)
+        return unchecked
+
+    def print_status(self, repo_name, has_actions):
+        if has_actions:
+            print(f"{GREEN}{self.username}/{repo_name} has GitHub Actions{RESET}")
+        else:
+            print(f"{self.username}/{repo_name} does not have GitHub Actions")
+
+
+def make_cache(args) -> Optional[HttpCache]:
+    """Return the HTTP cache configured by the command line, if enabled."""
+    if getattr(args, "no_cache", False):
+        return None
+    return HttpCache(
+        max_bytes=getattr(args, "cache_size", DEFAULT_CACHE_MB) * 1024 * 1024
+    )
+
+
+def make_store(args) -> Optional[WorkflowStatusStore]:
+    """Return the workflow status store configured by the command line, if enabled."""
+    if getattr(args, "no_store", False):
+        return None
+    return WorkflowStatusStore(getattr(args, "store", None))
+
+
+def print_changes(store: Optional[WorkflowStatusStore]):
+    """Print the repositories which gained or lost GitHub Actions during the run."""
+    if not store or not store.changes:
+        return
+    print("Changes since the last run:")
+    for change in sorted(store.changes):
+        verb = "gained" if change.has_actions else "lost"
+        sign = "+" if change.has_actions else "-"
+        print(f"  {sign} {change.owner}/{change.repo} {verb} GitHub Actions")
+
+
+def add_arguments(parser):
+    """Add the command line arguments shared by the detectors."""
+    parser.add_argument(
+        "usernames",
+        nargs="+",
+        type=str,
+        help="The username(s)/org name(s) on GitHub",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=graphql.BATCH_SIZE,
+        help="Repositories checked per GraphQL query, 0 to use one REST call per repository",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not revalidate or store responses in the on-disk HTTP cache",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_MB,
+        help=f"Maximum size of the on-disk HTTP cache in MiB (default: {DEFAULT_CACHE_MB})",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=MAX_CONCURRENCY,
+        help=f"Upper bound of the GitHub API requests in flight (default: {MAX_CONCURRENCY})",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Check every repository, even those not pushed to since their last check",
+    )
+    parser.add_argument(
+        "--store",
+        help=f"SQLite workflow status store (default: {WorkflowStatusStore.default_path()})",
+    )
+    parser.add_argument(
+        "--no-store",
+        action="store_true",
+        help="Neither read nor update the workflow status store",
+    )
+    parser.add_argument(
+        "--api-url",
+        default=DetectorCore.GITHUB_URL,
+        help="Root of the GitHub API, e.g. of a GitHub Enterprise server",
+    )
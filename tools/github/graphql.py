@@ -0,0 +1,58 @@
+"""Batched GraphQL queries checking many repositories for GitHub Actions at once."""
+import json
+from typing import Dict, List, Optional
+
+WORKFLOWS_PATH = ".github/workflows"
+BATCH_SIZE = 50
+
+
+def build_workflows_query(owner: str, repos: List[dict]) -> str:
+    """Build a single query looking up the workflows tree of every repository.
+
+    Every repository gets its own alias, r0, r1, ..., in the order of the repos list.
+    The workflows directory is looked up on the default branch of the listing payload.
+
+    Args:
+        owner (str): The user or organization owning the repositories.
+        repos (List[dict]): Repositories from the listing, with name and default_branch.
+
+    Returns:
+        str: The GraphQL query.
+    """
+    fields = []
+    for index, repo in enumerate(repos):
+        expression = f"{repo['default_branch']}:{WORKFLOWS_PATH}"
+        fields.append(
+            f"r{index}: repository(owner: {json.dumps(owner)}, "
+            f"name: {json.dumps(repo['name'])}) "
+            f"{{ object(expression: {json.dumps(expression)}) {{ __typename }} }}"
+        )
+    return "query {\n" + "\n".join(fields) + "\n}"
+
+
+def parse_workflows_response(
+    payload: dict, repos: List[dict]
+) -> Optional[Dict[str, bool]]:
+    """Tell which repositories have a workflows directory from the query response.
+
+    Args:
+        payload (dict): The decoded JSON response of the query.
+        repos (List[dict]): The repositories the query was built from.
+
+    Returns:
+        Optional[Dict[str, bool]]: Whether each repository has GitHub Actions, by name,
+            or None when the response holds no data and the REST API must be used.
+            The repositories whose alias is null, because looking them up failed, are
+            left out and must be checked with the REST API too.
+    """
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if not data:
+        return None
+    results = {}
+    for index, repo in enumerate(repos):
+        repository = data.get(f"r{index}")
+        if repository is None:
+            continue
+        tree = repository.get("object") or {}
+        results[repo["name"]] = tree.get("__typename") == "Tree"
+    return results
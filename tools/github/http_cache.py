@@ -0,0 +1,136 @@
+"""On-disk HTTP cache revalidating responses with ETag and Last-Modified.
+
+GitHub does not count a 304 Not Modified answer to a conditional request against the
+rate limit, so a steady-state run which only revalidates its cached responses is
+nearly free. The cache is shared by the requests and the aiohttp based checkers: it
+only stores and returns plain CachedResponse records, the clients do the requests.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, NamedTuple, Optional
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class CachedResponse(NamedTuple):
+    """The parts of a response needed by the checkers."""
+
+    status: int
+    body: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    link: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    @property
+    def links(self) -> Dict[str, dict]:
+        """Return the Link header parsed the way requests and aiohttp do, by rel."""
+        return parse_links(self.link)
+
+    def json(self):
+        return json.loads(self.body)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Return the headers revalidating this response."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def parse_links(header: Optional[str]) -> Dict[str, dict]:
+    """Parse a Link header into {rel: {"url": url, "rel": rel}}."""
+    links = {}
+    for link in (header or "").split(","):
+        url, _, params = link.partition(";")
+        url = url.strip().strip("<>")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "rel" and url:
+                rel = value.strip("\"'")
+                links[rel] = {"url": url, "rel": rel}
+    return links
+
+
+class HttpCache:
+    """Responses stored as one JSON file per URL, evicting the least recently used.
+
+    Reading an entry bumps the modification time of its file, which is the order
+    of the eviction once the files take more than max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or self.default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def default_cache_dir() -> str:
+        cache_dir = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+        return os.path.join(cache_dir, "github_checkers")
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _entries(self):
+        """Yield (path, mtime, size) of every cached file."""
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_mtime, stat.st_size
+
+    def load(self, url: str) -> Optional[CachedResponse]:
+        """Return the cached response of a URL, if any."""
+        path = self._path(url)
+        try:
+            with open(path, encoding="utf-8") as file:
+                response = CachedResponse(**json.load(file))
+            os.utime(path)
+        except (OSError, ValueError, TypeError):
+            return None
+        return response
+
+    def store(self, url: str, response: CachedResponse) -> bool:
+        """Store a successful response which can be revalidated later.
+
+        Returns:
+            bool: Whether the response was stored.
+        """
+        if not response.ok or not (response.etag or response.last_modified):
+            return False
+        data = json.dumps(response._asdict()).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return False
+        path = self._path(url)
+        with self._lock:
+            with contextlib.suppress(OSError):
+                self._size -= os.path.getsize(path)
+            with open(path, "wb") as file:
+                file.write(data)
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+        return True
+
+    def _evict(self):
+        """Remove the least recently used files until the cache fits max_bytes."""
+        for path, _, size in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._size -= size
@@ -0,0 +1,211 @@
+"""A local stand-in for the parts of the GitHub API used by the detectors.
+
+It serves the paginated repository listings, the workflows directories, the batched
+GraphQL query and ETag revalidation, with an optional latency added to every request.
+Repositories whose name ends with an even number have GitHub Actions. Used by the
+tests and by the benchmark.
+"""
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Set
+from urllib.parse import parse_qs, urlparse
+
+PUSHED_AT = "2024-01-01T00:00:00Z"
+ALIAS = re.compile(
+    r'(r\d+): repository\(owner: "([^"]+)", name: "([^"]+)"\) '
+    r'\{ object\(expression: "([^"]+)"\)'
+)
+
+
+def repo_names(count: int, prefix: str = "repo") -> List[str]:
+    """Return the names of count repositories, half of which have GitHub Actions."""
+    return [f"{prefix}-{index:03}" for index in range(count)]
+
+
+def has_workflows(repo_name: str) -> bool:
+    return int(repo_name.rsplit("-", 1)[1]) % 2 == 0
+
+
+def tracked(method):
+    """Add the latency and record the highest number of requests handled at once."""
+
+    @functools.wraps(method)
+    def wrapper(self):
+        with self.lock:
+            self.in_flight["now"] += 1
+            self.in_flight["max"] = max(self.in_flight["max"], self.in_flight["now"])
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+            return method(self)
+        finally:
+            with self.lock:
+                self.in_flight["now"] -= 1
+
+    return wrapper
+
+
+class MockGithubHandler(BaseHTTPRequestHandler):
+    """Answer the requests of the detectors, counting them by method and status.
+
+    The class attributes are the settings of the server, every MockGithubServer uses
+    its own subclass.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    repos: Dict[str, List[str]] = {}
+    pushed_at: Dict[str, str] = {}
+    has_actions: Dict[str, bool] = {}
+    latency = 0.0
+    graphql_available = True
+    graphql_errors: Set[str] = set()
+    workflow_errors: Dict[str, int] = {}
+    throttle_every = 0
+    requests = Counter()
+    in_flight = Counter()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data).encode()
+        if self.command == "GET" and status == 200:
+            etag = f'"{hashlib.sha256(body).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                with self.lock:
+                    self.requests["304"] += 1
+                status, body = 304, b""
+            headers = {**(headers or {}), "ETag": etag}
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    @tracked
+    def do_POST(self):
+        with self.lock:
+            self.requests["POST"] += 1
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.graphql_available:
+            return self.send_json({"data": None, "errors": [{"message": "Timeout"}]})
+        data = {}
+        errors = []
+        for alias, _, name, expression in ALIAS.findall(body["query"]):
+            if name in self.graphql_errors:
+                data[alias] = None
+                errors.append({"path": [alias], "message": "Something went wrong"})
+                continue
+            found = expression == "main:.github/workflows" and self.has_workflows(name)
+            data[alias] = {"object": {"__typename": "Tree"} if found else None}
+        self.send_json({"data": data, **({"errors": errors} if errors else {})})
+
+    @tracked
+    def do_GET(self):
+        with self.lock:
+            self.requests["GET"] += 1
+            throttled = (
+                self.throttle_every and self.requests["GET"] % self.throttle_every == 0
+            )
+            if throttled:
+                self.requests["429"] += 1
+        if throttled:
+            return self.send_json(
+                {"message": "secondary rate limit"}, 429, {"Retry-After": "0"}
+            )
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        if parts[0] == "users" and parts[2:] == ["repos"]:
+            return self.send_repos(url.path, parts[1], query)
+        workflows = parts[0] == "repos" and parts[3:] == [
+            "contents",
+            ".github",
+            "workflows",
+        ]
+        if workflows and parts[2] in self.workflow_errors:
+            return self.send_json(
+                {"message": "Server Error"}, self.workflow_errors[parts[2]]
+            )
+        if workflows and self.has_workflows(parts[2]):
+            return self.send_json([{"name": "ci.yml"}])
+        self.send_json({"message": "Not Found"}, 404)
+
+    def has_workflows(self, repo_name):
+        return self.has_actions.get(repo_name, has_workflows(repo_name))
+
+    def send_repos(self, path, username, query):
+        names = self.repos.get(username)
+        if names is None:
+            return self.send_json({"message": "Not Found"}, 404)
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        last_page = max(1, -(-len(names) // per_page))
+        start = (page - 1) * per_page
+        repos = [
+            {
+                "name": name,
+                "default_branch": "main",
+                "pushed_at": self.pushed_at.get(name, PUSHED_AT),
+            }
+            for name in names[start:][:per_page]
+        ]
+        base = f"http://{self.headers['Host']}{path}?per_page={per_page}"
+        links = [f'<{base}&page={last_page}>; rel="last"']
+        if page < last_page:
+            links.append(f'<{base}&page={page + 1}>; rel="next"')
+        self.send_json(repos, headers={"Link": ", ".join(links)})
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # the detectors open up to --max-concurrency connections at once
+    request_queue_size = 128
+
+
+class MockGithubServer:
+    """Serve the stand-in GitHub API on a free local port, in a background thread.
+
+    Args:
+        repos (Dict[str, List[str]]): The repository names of every user.
+        latency (float): Seconds added to every request.
+    """
+
+    def __init__(self, repos: Dict[str, List[str]], latency: float = 0.0):
+        self.handler = type(
+            "Handler",
+            (MockGithubHandler,),
+            {
+                "repos": repos,
+                "latency": latency,
+                "requests": Counter(),
+                "in_flight": Counter(),
+                "lock": threading.Lock(),
+            },
+        )
+        self.server = _HTTPServer(("127.0.0.1", 0), self.handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        """Start serving."""
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def requests(self) -> Counter:
+        return self.handler.requests
@@ -0,0 +1,155 @@
+"""Rate-limit-aware scheduling of the GitHub API requests.
+
+The number of requests in flight adapts AIMD-style: it grows by about one per round of
+successful responses and is halved when GitHub throttles or fails. Throttled requests
+are retried after the delay asked by Retry-After or X-RateLimit-Reset, or a minute when
+a secondary rate limit comes without either header, other failures after an exponential
+backoff with full jitter. When the X-RateLimit-Remaining budget
+runs low, new requests wait for the reset instead of getting blocked.
+"""
+import asyncio
+import contextlib
+import random
+import threading
+import time
+from typing import Mapping, Optional
+
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+# GitHub asks to wait at least a minute for a secondary rate limit without Retry-After
+SECONDARY_RATE_LIMIT_WAIT = 60.0
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class RateLimitScheduler:
+    """Bound the requests in flight of the threaded checker.
+
+    Args:
+        max_concurrency (int): Upper bound of the requests in flight.
+        max_retries (int): Retries of a throttled or failed request before giving up.
+    """
+
+    def __init__(
+        self, max_concurrency: int = MAX_CONCURRENCY, max_retries: int = MAX_RETRIES
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.limit = float(min(INITIAL_CONCURRENCY, max_concurrency))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Wait until a request may be sent and hold its slot while it is in flight."""
+        with self._condition:
+            while (wait := self._wait_time()) != 0:
+                self._condition.wait(wait)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def _wait_time(self) -> Optional[float]:
+        """Return 0 when a request may start, else the time to wait, None to wait for a slot."""
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+        if self.in_flight >= int(self.limit):
+            return None
+        return 0
+
+    def on_response(
+        self, status: int, headers: Mapping[str, str], attempt: int, body: str = ""
+    ) -> Optional[float]:
+        """Adapt the concurrency to a response and tell whether to retry its request.
+
+        Args:
+            status (int): The HTTP status of the response.
+            headers (Mapping[str, str]): The response headers, looked up case-insensitively.
+            attempt (int): How many times the request was already retried.
+            body (str): The response body, telling a rate-limited 403 from a denied one.
+
+        Returns:
+            Optional[float]: Seconds to sleep before retrying, None when the response is final.
+        """
+        throttled_for = self._throttled_for(status, headers, body)
+        with self._condition:
+            if throttled_for is None and status not in RETRY_STATUSES:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self._pause_when_exhausted(headers)
+                self._condition.notify_all()
+                return None
+
+            now = time.monotonic()
+            # halve once per round trip rather than once per failed request in flight
+            if now - self._last_decrease > 1:
+                self.limit = max(1.0, self.limit / 2)
+                self._last_decrease = now
+            if throttled_for:
+                self.paused_until = max(self.paused_until, now + throttled_for)
+
+        if attempt >= self.max_retries:
+            return None
+        if throttled_for is not None:
+            return throttled_for + random.uniform(0, BACKOFF_BASE)  # noqa: S311
+        ceiling = min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt)
+        return random.uniform(0, ceiling)  # noqa: S311
+
+    @staticmethod
+    def _throttled_for(
+        status: int, headers: Mapping[str, str], body: str = ""
+    ) -> Optional[float]:
+        """Return how long GitHub asks to wait, None when the response is not throttled."""
+        if status not in (403, 429):
+            return None
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            with contextlib.suppress(ValueError):
+                return max(0.0, float(retry_after))
+        if headers.get("X-RateLimit-Remaining") == "0":
+            reset = headers.get("X-RateLimit-Reset")
+            return max(0.0, float(reset) - time.time()) if reset else 0.0
+        if status == 429 or "rate limit" in body.lower():
+            return SECONDARY_RATE_LIMIT_WAIT
+        # other 403s are plain permission errors
+        return None
+
+    def _pause_when_exhausted(self, headers: Mapping[str, str]):
+        """Hold the new requests until the reset when the remaining budget is this low."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None or int(remaining) > self.limit:
+            return
+        pause = float(reset) - time.time()
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+
+class AsyncRateLimitScheduler(RateLimitScheduler):
+    """Bound the requests in flight of the asyncio checker."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._async_condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Wait until a request may be sent and hold its slot while it is in flight."""
+        async with self._async_condition:
+            while (wait := self._wait_time()) != 0:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._async_condition.wait(), wait)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._async_condition:
+                self.in_flight -= 1
+                self._async_condition.notify_all()
@@ -0,0 +1,92 @@
+"""SQLite store of the last workflow status of every repository.
+
+The workflow status of a repository can only change with a push, or when its default
+branch changes. Both come with the listing payload, as pushed_at and default_branch, so
+a repository whose values match the stored ones is not probed again.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS statuses (
+    owner TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    pushed_at TEXT,
+    default_branch TEXT,
+    has_actions INTEGER NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (owner, repo)
+)
+"""
+
+
+class StatusChange(NamedTuple):
+    owner: str
+    repo: str
+    has_actions: bool
+
+
+class WorkflowStatusStore:
+    """The last result of every repository, shared by the threads of a run.
+
+    Args:
+        path (str): The SQLite database, default_path() by default.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or self.default_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute(SCHEMA)
+        self.changes: List[StatusChange] = []
+        self._lock = threading.Lock()
+        self._rows: Dict[str, Dict[str, tuple]] = {}
+
+    @staticmethod
+    def default_path() -> str:
+        cache_dir = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+        return os.path.join(cache_dir, "github_checkers", "workflows.sqlite")
+
+    def _owner_rows(self, owner: str) -> Dict[str, tuple]:
+        """Return (pushed_at, default_branch, has_actions) by repo, read once per owner."""
+        with self._lock:
+            if owner not in self._rows:
+                rows = self.connection.execute(
+                    "SELECT repo, pushed_at, default_branch, has_actions "
+                    "FROM statuses WHERE owner = ?",
+                    (owner,),
+                )
+                self._rows[owner] = {repo: tuple(values) for repo, *values in rows}
+            return self._rows[owner]
+
+    def unchanged(self, owner: str, repo: dict) -> Optional[bool]:
+        """Return the stored status of a repository not pushed to since, else None."""
+        row = self._owner_rows(owner).get(repo["name"])
+        pushed_at = repo.get("pushed_at")
+        if row is None or pushed_at is None:
+            return None
+        if row[:2] != (pushed_at, repo.get("default_branch")):
+            return None
+        return bool(row[2])
+
+    def record(self, owner: str, repo: dict, has_actions: bool):
+        """Store the status of a repository, noting whether it gained or lost Actions."""
+        rows = self._owner_rows(owner)
+        values = (repo.get("pushed_at"), repo.get("default_branch"), int(has_actions))
+        with self._lock:
+            previous = rows.get(repo["name"])
+            if previous is not None and bool(previous[2]) != has_actions:
+                self.changes.append(StatusChange(owner, repo["name"], has_actions))
+            rows[repo["name"]] = values
+            self.connection.execute(
+                "INSERT OR REPLACE INTO statuses VALUES (?, ?, ?, ?, ?, ?)",
+                (owner, repo["name"], *values, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self.connection.commit()
+            self.connection.close()
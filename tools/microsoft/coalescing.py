@@ -0,0 +1,211 @@
+"""Deduplication, throttling and coalescing of MS Teams notifications.
+
+Incoming webhooks throttle bursts, while alerting loops tend to send the same message
+over and over. CoalescingNotifier sits in front of MSTeamNotification:
+
+- a message already sent within the dedup TTL of its first sending is dropped, one
+  whose sending failed is not,
+- the messages queued within a short window are combined into one MessageCard with
+  a section per message,
+- the cards are sent through a token bucket shared by all the notifiers of a webhook.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from tools.microsoft.teams_notify import MSTeamNotification
+
+DEDUP_TTL = 300.0
+DEDUP_MAX_SIZE = 1024
+WINDOW = 2.0
+# Teams accepts about 4 requests per second on a webhook, keep clear of it
+RATE = 1.0
+BURST = 4
+MAX_SECTIONS = 10
+
+
+class DedupCache:
+    """Remember the keys seen within ttl seconds, at most max_size of them, oldest first out.
+
+    The TTL runs from the first time a key is seen, seeing it again does not extend it.
+    """
+
+    def __init__(self, ttl: float = DEDUP_TTL, max_size: int = DEDUP_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._expiries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, key) -> bool:
+        """Tell whether the key was seen within ttl seconds, else remember it."""
+        now = time.monotonic()
+        with self._lock:
+            expiry = self._expiries.get(key)
+            if expiry is not None and expiry > now:
+                return True
+            self._expiries.pop(key, None)
+            self._expiries[key] = now + self.ttl
+            while len(self._expiries) > self.max_size:
+                self._expiries.popitem(last=False)
+        return False
+
+    def forget(self, key):
+        """Forget a key, so that it is not seen anymore."""
+        with self._lock:
+            self._expiries.pop(key, None)
+
+
+class TokenBucket:
+    """Allow rate requests per second on average, in bursts of up to capacity."""
+
+    def __init__(self, rate: float = RATE, capacity: int = BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, sleeping until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            # a negative balance is the debt paid by sleeping, in arrival order
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(webhook_url: str, rate: float = RATE, capacity: int = BURST):
+    """Return the token bucket shared by all the notifiers of a webhook."""
+    with _buckets_lock:
+        if webhook_url not in _buckets:
+            _buckets[webhook_url] = TokenBucket(rate, capacity)
+        return _buckets[webhook_url]
+
+
+def combine_messages(messages: List[dict]) -> dict:
+    """Combine MessageCards into one, with a section per message."""
+    if len(messages) == 1:
+        return messages[0]
+    return {
+        "@type": "MessageCard",
+        "@context": "https://schema.org/extensions",
+        "summary": f"{len(messages)} notifications",
+        "title": f"{len(messages)} notifications",
+        "sections": [
+            {
+                "activityTitle": message.get("title"),
+                "activitySubtitle": message.get("summary"),
+                "text": message.get("text"),
+            }
+            for message in messages
+        ],
+    }
+
+
+class CoalescingNotifier:
+    """Send MS Teams notifications deduplicated, combined and throttled.
+
+    The first notification of a window starts a timer, and everything queued until it
+    fires is sent as cards of up to MAX_SECTIONS sections. The flushes run one at a
+    time, so the cards leave in order. Use the object as a context manager, or call
+    close, to send what is still queued.
+
+    Args:
+        notification (MSTeamNotification): Sends the cards to the webhook.
+        window (float): Seconds during which the notifications are combined.
+        dedup_ttl (float): Seconds during which a repeated notification is dropped.
+        rate (float): Cards per second allowed on the webhook, on average.
+        burst (int): Cards allowed at once on the webhook.
+    """
+
+    def __init__(
+        self,
+        notification: MSTeamNotification,
+        window: float = WINDOW,
+        dedup_ttl: float = DEDUP_TTL,
+        rate: float = RATE,
+        burst: int = BURST,
+    ):
+        self.notification = notification
+        self.window = window
+        self.dedup = DedupCache(dedup_ttl)
+        self.bucket = get_bucket(notification.webhook_url, rate, burst)
+        self.sent_cards = 0
+        self._pending: List[Tuple[tuple, dict]] = []
+        self._timer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def __enter__(self):
+        """Return the notifier."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Send the queued notifications."""
+        self.close()
+
+    def notify(
+        self, summary: str = "summary", title: str = "title", text: str = "test"
+    ) -> bool:
+        """Queue a notification, unless the same one was sent recently.
+
+        Returns:
+            bool: Whether the notification was queued.
+        """
+        key = (summary, title, text)
+        if self.dedup.seen(key):
+            return False
+        message = self.notification.build_message(summary, title, text)
+        with self._lock:
+            self._pending.append((key, message))
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    def flush(self):
+        """Send the queued notifications now.
+
+        The notifications of a card which could not be sent are forgotten by the dedup
+        cache, so that they are sent again the next time they are notified.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            while pending:
+                card_pending, pending = pending[:MAX_SECTIONS], pending[MAX_SECTIONS:]
+                self.bucket.acquire()
+                card = combine_messages([message for _, message in card_pending])
+                if not self.notification.send_notification(card):
+                    for key, _ in card_pending:
+                        self.dedup.forget(key)
+                    continue
+                self.sent_cards += 1
+
+    def close(self):
+        """Send the queued notifications, once the flush of a fired timer is done.
+
+        The notification can be closed as soon as this returns, no card is left being
+        sent in the background.
+        """
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+            timer.join()
+        self.flush()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Durable outbox of MS Teams notifications and the daemon flushing it.
+
+teams_notify.py --outbox only appends the message to a local SQLite spool and returns,
+so a slow or down webhook never delays the caller. The flush daemon drains the spool
+in batches. A message is deleted only once its webhook accepted it: a crash in
+between delivers it again, never loses it. Claimed messages are leased for a while so
+that several daemons can share a spool, and failed ones are retried with an
+exponential backoff. A message the webhook rejects for good, with a 4xx other than 408
+or 429, or which still fails after MAX_ATTEMPTS attempts, is moved to the dead_letters
+table instead, to be looked into rather than retried forever.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from typing import List, NamedTuple, Optional, Tuple
+
+from tools.microsoft.teams_notify import DEFAULT_WORKERS, MSTeamNotification
+
+BATCH_SIZE = 100
+LEASE_SECONDS = 300
+RETRY_BASE_SECONDS = 5
+RETRY_CAP_SECONDS = 3600
+# about 2.5 hours of retries with the backoff above
+MAX_ATTEMPTS = 12
+# 4xx answers worth retrying: request timeout and throttling
+TRANSIENT_STATUSES = (408, 429)
+FLUSH_INTERVAL = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    webhook_url TEXT NOT NULL,
+    message TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY,
+    webhook_url TEXT NOT NULL,
+    message TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    status INTEGER,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+)
+"""
+
+
+def retry_delay(attempts: int) -> float:
+    """Return the seconds to wait before retrying a message failed attempts + 1 times."""
+    return min(RETRY_CAP_SECONDS, RETRY_BASE_SECONDS * 2**attempts)
+
+
+def is_permanent(status: Optional[int]) -> bool:
+    """Tell whether the webhook rejected a message for good, retrying it is useless."""
+    return (
+        status is not None and 400 <= status < 500 and status not in TRANSIENT_STATUSES
+    )
+
+
+class OutboxItem(NamedTuple):
+    id: int
+    webhook_url: str
+    message: dict
+    attempts: int
+
+
+class Outbox:
+    """A spool of notifications waiting to be sent, in a SQLite database.
+
+    Args:
+        path (str): The database, default_path() by default.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or self.default_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # autocommit, the transactions are opened explicitly
+        self.connection = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    @staticmethod
+    def default_path() -> str:
+        state_dir = os.environ.get(
+            "XDG_STATE_HOME", os.path.expanduser("~/.local/state")
+        )
+        return os.path.join(state_dir, "teams_notify", "outbox.sqlite")
+
+    @contextlib.contextmanager
+    def _transaction(self, mode: str = ""):
+        self.connection.execute(f"BEGIN {mode}")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def __len__(self):
+        """Return the number of messages in the spool."""
+        return self.connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def put(self, webhook_url: str, message: dict) -> int:
+        """Append a message to the spool and return its id."""
+        now = time.time()
+        cursor = self.connection.execute(
+            "INSERT INTO outbox (webhook_url, message, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (webhook_url, json.dumps(message), now, now),
+        )
+        return cursor.lastrowid
+
+    def claim(self, batch_size: int = BATCH_SIZE) -> List[OutboxItem]:
+        """Lease the oldest messages due for sending, for LEASE_SECONDS."""
+        now = time.time()
+        # IMMEDIATE takes the write lock first, no other daemon claims the same rows
+        with self._transaction("IMMEDIATE"):
+            rows = self.connection.execute(
+                "SELECT id, webhook_url, message, attempts FROM outbox "
+                "WHERE next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (now, batch_size),
+            ).fetchall()
+            self.connection.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(now + LEASE_SECONDS, row[0]) for row in rows],
+            )
+        return [
+            OutboxItem(item_id, webhook_url, json.loads(message), attempts)
+            for item_id, webhook_url, message, attempts in rows
+        ]
+
+    def ack(self, ids: List[int]):
+        """Delete the messages which were sent."""
+        with self._transaction():
+            self.connection.executemany(
+                "DELETE FROM outbox WHERE id = ?", [(item_id,) for item_id in ids]
+            )
+
+    def retry_later(self, items: List[OutboxItem]):
+        """Release the messages which failed, to be retried after a backoff."""
+        now = time.time()
+        with self._transaction():
+            self.connection.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE id = ?",
+                [
+                    (item.attempts + 1, now + retry_delay(item.attempts), item.id)
+                    for item in items
+                ],
+            )
+
+    def dead_letter(self, items: List[OutboxItem], statuses: List[Optional[int]]):
+        """Move the messages which will never be sent to the dead_letters table."""
+        now = time.time()
+        with self._transaction():
+            self.connection.executemany(
+                "INSERT INTO dead_letters (id, webhook_url, message, attempts, status, "
+                "created_at, failed_at) SELECT id, webhook_url, message, ?, ?, "
+                "created_at, ? FROM outbox WHERE id = ?",
+                [
+                    (item.attempts + 1, status, now, item.id)
+                    for item, status in zip(items, statuses)
+                ],
+            )
+            self.connection.executemany(
+                "DELETE FROM outbox WHERE id = ?", [(item.id,) for item in items]
+            )
+
+    def dead_letters(self) -> List[Tuple[OutboxItem, Optional[int]]]:
+        """Return the dead-lettered messages, with the last status of their webhook."""
+        rows = self.connection.execute(
+            "SELECT id, webhook_url, message, attempts, status FROM dead_letters "
+            "ORDER BY id"
+        ).fetchall()
+        return [
+            (OutboxItem(item_id, webhook_url, json.loads(message), attempts), status)
+            for item_id, webhook_url, message, attempts, status in rows
+        ]
+
+    def close(self):
+        self.connection.close()
+
+
+def flush_outbox(
+    outbox: Outbox, batch_size: int = BATCH_SIZE, workers: int = DEFAULT_WORKERS
+) -> Tuple[int, int, int]:
+    """Send every message due in the spool, batch after batch.
+
+    Returns:
+        Tuple[int, int, int]: The number of messages sent, to retry and dead-lettered.
+    """
+    sent = failed = dead = 0
+    senders = {}
+    try:
+        while items := outbox.claim(batch_size):
+            by_webhook = defaultdict(list)
+            for item in items:
+                by_webhook[item.webhook_url].append(item)
+            for webhook_url, webhook_items in by_webhook.items():
+                if webhook_url not in senders:
+                    senders[webhook_url] = MSTeamNotification(
+                        webhook_url, workers=workers
+                    )
+                statuses = senders[webhook_url].deliver_many(
+                    [item.message for item in webhook_items]
+                )
+                done, retries, rejected, rejected_statuses = [], [], [], []
+                for item, status in zip(webhook_items, statuses):
+                    if status == 200:
+                        done.append(item.id)
+                    elif is_permanent(status) or item.attempts + 1 >= MAX_ATTEMPTS:
+                        rejected.append(item)
+                        rejected_statuses.append(status)
+                    else:
+                        retries.append(item)
+                outbox.ack(done)
+                outbox.retry_later(retries)
+                outbox.dead_letter(rejected, rejected_statuses)
+                sent += len(done)
+                failed += len(retries)
+                dead += len(rejected)
+    finally:
+        for sender in senders.values():
+            sender.close()
+    return sent, failed, dead
+
+
+def run_daemon(
+    outbox: Outbox,
+    interval: float = FLUSH_INTERVAL,
+    once: bool = False,
+    batch_size: int = BATCH_SIZE,
+    workers: int = DEFAULT_WORKERS,
+):
+    """Flush the spool every interval seconds, or once."""
+    while True:
+        sent, failed, dead = flush_outbox(outbox, batch_size, workers)
+        if sent or failed or dead:
+            print(
+                f"Flushed the outbox: {sent} sent, {failed} to retry, "
+                f"{dead} dead-lettered, {len(outbox)} left"
+            )
+        if once:
+            return
+        time.sleep(interval)
+
+
+def main():
+    """Main entrypoint."""
+    parser = argparse.ArgumentParser(
+        description="Send the MS Teams notifications spooled by teams_notify.py --outbox."
+    )
+    parser.add_argument(
+        "--outbox-file",
+        help=f"The spool to drain (default: {Outbox.default_path()}).",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="Flush once and exit instead of looping."
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=FLUSH_INTERVAL,
+        help=f"Seconds between two flushes (default: {FLUSH_INTERVAL}).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help=f"Messages claimed at once (default: {BATCH_SIZE}).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Notifications sent concurrently (default: {DEFAULT_WORKERS}).",
+    )
+    args = parser.parse_args()
+
+    outbox = Outbox(args.outbox_file)
+    try:
+        with contextlib.suppress(KeyboardInterrupt):
+            run_daemon(outbox, args.interval, args.once, args.batch_size, args.workers)
+    finally:
+        outbox.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
 #!/usr/bin/env python3
 """A simple script to send notification message to MS Teams."""
 import argparse
+import concurrent.futures
 import os
+import threading
+from typing import List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts of a webhook call, in seconds
+TIMEOUT = (3.05, 10)
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 503)
+DEFAULT_WORKERS = 8
 
 
 class MissingIncomingWebhook(Exception):
@@ -13,14 +25,67 @@ class MissingIncomingWebhook(Exception):
 
 
 class MSTeamNotification:
-    """A simple MS Team notification class."""
+    """A simple MS Team notification class.
+
+    The notifications are posted over one keep-alive session, with timeouts, and are
+    retried with an exponential backoff on 429 and 503 answers, honouring Retry-After.
+    send_in_background returns immediately and send_many posts many messages
+    concurrently, both on a pool of workers sharing the session. Use the object as a
+    context manager, or call close, to wait for the pending notifications.
+
+    Args:
+        webhook_url (str): The incoming webhook URL of the channel.
+        timeout (tuple): The (connect, read) timeouts of a call, in seconds.
+        max_retries (int): Retries of a throttled or failed call.
+        backoff_factor (float): Base of the exponential backoff between retries, in seconds.
+        workers (int): Notifications sent at once, and size of the connection pool.
+    """
 
-    def __init__(self, webhook_url: str):
+    def __init__(
+        self,
+        webhook_url: str,
+        timeout: tuple = TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        backoff_factor: float = BACKOFF_FACTOR,
+        workers: int = DEFAULT_WORKERS,
+    ):
         self.webhook_url = webhook_url
         self.headers = {"Content-Type": "application/json"}
+        self.timeout = timeout
+        self.workers = workers
+        # POST is not idempotent: it is retried only when the webhook did not take
+        # it, a connection which could not be opened or a 429 or 503 answer. A read
+        # timeout, or a 500 or 504, may come after the card was posted, retrying
+        # would post it twice.
+        retry = Retry(
+            total=max_retries,
+            read=0,
+            other=0,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        """Return the notification sender."""
+        return self
 
+    def __exit__(self, *exc_info):
+        """Wait for the pending notifications and close the session."""
+        self.close()
+
+    @staticmethod
     def build_message(
-        self, summary: str = "summary", title: str = "title", text: str = "test"
+        summary: str = "summary", title: str = "title", text: str = "test"
     ):
         """Build a message object."""
         message = {
@@ -32,20 +97,86 @@ class MSTeamNotification:
         }
         return message
 
-    def send_notification(self, message: dict):
+    def send_notification(self, message: dict) -> bool:
         """This function sends a notification to a webhook URL using the provided message and headers.
 
         Args:
             message (dict): A dictionary containing the notification message to be sent.
 
         Returns:
-            None
+            bool: Whether the notification was sent.
+        """
+        return self.deliver(message) == 200
+
+    def deliver(self, message: dict) -> Optional[int]:
+        """Send a notification and return the status the webhook answered with.
+
+        Returns:
+            Optional[int]: The HTTP status, None when the webhook could not be reached.
         """
-        response = requests.post(self.webhook_url, json=message, headers=self.headers)
+        try:
+            response = self.session.post(
+                self.webhook_url, json=message, timeout=self.timeout
+            )
+        except requests.RequestException as exc:
+            print(f"Failed to send notification: {exc}")
+            return None
         if response.status_code == 200:
             print("Notification sent successfully")
         else:
             print(f"Failed to send notification, status code: {response.status_code}")
+        return response.status_code
+
+    def send_in_background(self, message: dict) -> concurrent.futures.Future:
+        """Send a notification from a worker thread and return immediately.
+
+        Returns:
+            Future: Resolves to whether the notification was sent.
+        """
+        return self._submit(self.send_notification, message)
+
+    def _submit(self, send, message: dict) -> concurrent.futures.Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="teams-notify"
+                )
+            future = self._executor.submit(send, message)
+            self._pending.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def send_many(self, messages: List[dict]) -> List[bool]:
+        """Send many notifications concurrently and wait for all of them.
+
+        Returns:
+            List[bool]: Whether each notification was sent, in the order of messages.
+        """
+        futures = [self.send_in_background(message) for message in messages]
+        return [future.result() for future in futures]
+
+    def deliver_many(self, messages: List[dict]) -> List[Optional[int]]:
+        """Send many notifications concurrently and return the status of each, see deliver."""
+        futures = [self._submit(self.deliver, message) for message in messages]
+        return [future.result() for future in futures]
+
+    def flush(self, timeout: float = None):
+        """Wait for the notifications sent in background so far."""
+        with self._lock:
+            pending = list(self._pending)
+        concurrent.futures.wait(pending, timeout=timeout)
+
+    def close(self):
+        """Wait for the pending notifications and release the connections."""
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
 
 
 def parse_args():
@@ -73,7 +204,28 @@ def parse_args():
         help="Title of the notification.",
     )
     parser.add_argument(
-        "-m", "--message", type=str, required=True, help="Text of the notification."
+        "-m",
+        "--message",
+        type=str,
+        required=True,
+        action="append",
+        help="Text of the notification. Repeat it to send several notifications at once.",
+    )
+    parser.add_argument(
+        "--outbox",
+        action="store_true",
+        help="Only append the notifications to the outbox, sent later by outbox.py.",
+    )
+    parser.add_argument(
+        "--outbox-file",
+        type=str,
+        help="The outbox database, by default in $XDG_STATE_HOME/teams_notify.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=TIMEOUT[1],
+        help=f"Read timeout of a webhook call in seconds (default: {TIMEOUT[1]}).",
     )
 
     try:
@@ -91,7 +243,7 @@ def notify_ms_teams():
     webhook_url = args.webhook
     summary = args.summary
     title = args.title
-    message = args.message
+    messages = args.message
 
     if webhook_url is None:
         try:
@@ -101,14 +253,32 @@ def notify_ms_teams():
                 "Missing webhook. Please set env variable MS_TEAMS_INCOMING_WEBHOOK or provide it via -w flag"
             )
 
-    print(f"Sending notification.. {summary=}, {title=}, {message=}")
-    notification = MSTeamNotification(webhook_url)
-    message = notification.build_message(
-        summary=summary,
-        title=title,
-        text=message,
-    )
-    notification.send_notification(message)
+    if args.outbox:
+        # imported here, outbox.py imports this module for MSTeamNotification
+        from tools.microsoft.outbox import Outbox
+
+        outbox = Outbox(args.outbox_file)
+        for message in messages:
+            outbox.put(
+                webhook_url,
+                MSTeamNotification.build_message(
+                    summary=summary, title=title, text=message
+                ),
+            )
+        print(f"Queued {len(messages)} notification(s) in {outbox.path}")
+        outbox.close()
+        return
+
+    print(f"Sending notification.. {summary=}, {title=}, {messages=}")
+    with MSTeamNotification(
+        webhook_url, timeout=(TIMEOUT[0], args.timeout)
+    ) as notification:
+        notification.send_many(
+            [
+                notification.build_message(summary=summary, title=title, text=message)
+                for message in messages
+            ]
+        )
 
 
 if __name__ == "__main__":
@@ -1,6 +1,110 @@
 #!/usr/bin/env python3
-"""Convert temperature between Celsius and Fahrenheit."""
+"""Convert temperature between Celsius, Fahrenheit, Kelvin and Rankine.
+
+A single value is converted with -t. Without it, the values are streamed from the
+files given, or stdin: newline or comma separated, read in chunks of whole lines so
+the memory stays bounded, and written back with the same layout. The fields which are
+not numbers, a CSV header or an empty field, are passed through unchanged. The chunks
+are converted in one vectorized call, with NumPy when it is installed, which is the
+optional numpy extra of the package: pip install "cli-tools[numpy]". NumPy then also
+parses and formats the chunks of one value per line, in C rather than value by value.
+"""
 import argparse
+import array
+import contextlib
+import functools
+import itertools
+import sys
+import warnings
+from fractions import Fraction
+from typing import BinaryIO, Iterable, List, NamedTuple, Optional, Tuple
+
+UNITS = ("C", "F", "K", "R")
+SYMBOLS = {"C": "°C", "F": "°F", "K": "K", "R": "°R"}
+# every unit as (value - offset) * scale = Celsius
+TO_CELSIUS = {
+    "C": (0, Fraction(1)),
+    "F": (32, Fraction(5, 9)),
+    "K": (273.15, Fraction(1)),
+    "R": (491.67, Fraction(5, 9)),
+}
+CHUNK_SIZE = 1024 * 1024
+
+
+class Conversion(NamedTuple):
+    """The affine map (value - offset) * numerator / denominator + shift."""
+
+    offset: float
+    numerator: int
+    denominator: int
+    shift: float
+
+    @classmethod
+    def between(cls, from_unit: str, to_unit: str) -> "Conversion":
+        """Return the conversion from a unit to another one."""
+        for unit in (from_unit, to_unit):
+            if unit not in TO_CELSIUS:
+                raise ValueError(f"Unknown unit {unit}, expected one of {UNITS}")
+        offset, scale = TO_CELSIUS[from_unit]
+        shift, target_scale = TO_CELSIUS[to_unit]
+        ratio = scale / target_scale
+        return cls(offset, ratio.numerator, ratio.denominator, shift)
+
+    def __call__(self, value: float) -> float:
+        """Convert a single value."""
+        return (value - self.offset) * self.numerator / self.denominator + self.shift
+
+    def apply_numpy(self, values):
+        """Convert a NumPy array into a new float64 array, in a single pass per step."""
+        import numpy as np
+
+        result = np.subtract(values, self.offset, dtype=np.float64)
+        if self.numerator != self.denominator:
+            result *= self.numerator
+            result /= self.denominator
+        if self.shift:
+            result += self.shift
+        return result
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    """Return the numpy module if installed, it is imported only when needed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def convert_batch(values, from_unit: str, to_unit: str):
+    """Convert many temperatures at once.
+
+    Args:
+        values: A NumPy array, a buffer of doubles (array.array("d"), memoryview, ...)
+            or any iterable of numbers.
+        from_unit (str): The unit of the values, one of UNITS.
+        to_unit (str): The unit to convert to, one of UNITS.
+
+    Returns:
+        A float64 NumPy array when NumPy is installed, else an array.array("d").
+    """
+    conversion = Conversion.between(from_unit, to_unit)
+    np = _numpy()
+    if np is None:
+        offset, numerator, denominator, shift = conversion
+        return array.array(
+            "d",
+            [(value - offset) * numerator / denominator + shift for value in values],
+        )
+    if isinstance(values, np.ndarray):
+        return conversion.apply_numpy(values)
+    try:
+        # the buffer format is honoured, e.g. array.array("f") is read as float32
+        values = np.asarray(memoryview(values), dtype=np.float64)
+    except (TypeError, ValueError):
+        values = np.fromiter(values, dtype=np.float64)
+    return conversion.apply_numpy(values)
 
 
 class TemperatureConverter:
@@ -9,32 +113,200 @@ class TemperatureConverter:
 
         Args:
             temperature (float): The temperature value to be converted.
-            unit (str): The unit of temperature to be converted, either Celsius (C) or Fahrenheit (F).
+            unit (str): The unit of temperature to be converted, Celsius (C), Fahrenheit (F),
+                Kelvin (K) or Rankine (R).
         """
         self.temperature = temperature
         self.unit = unit
 
+    def to(self, unit: str) -> float:
+        """Converts the temperature to a unit.
+
+        Returns:
+            float: The temperature in the unit.
+        """
+        if unit == self.unit:
+            return self.temperature
+        return Conversion.between(self.unit, unit)(self.temperature)
+
     def to_celsius(self) -> float:
-        """Converts a temperature from Fahrenheit to Celsius.
+        """Converts a temperature to Celsius.
 
         Returns:
             float: The temperature in Celsius.
         """
-        if self.unit == "F":
-            return (self.temperature - 32) * 5 / 9
-        else:
-            return self.temperature
+        return self.to("C")
 
     def to_fahrenheit(self) -> float:
-        """Converts a temperature from Celsius to Fahrenheit.
+        """Converts a temperature to Fahrenheit.
 
         Returns:
             float: The temperature in Fahrenheit.
         """
-        if self.unit == "C":
-            return self.temperature * 9 / 5 + 32
-        else:
-            return self.temperature
+        return self.to("F")
+
+    def to_kelvin(self) -> float:
+        """Converts a temperature to Kelvin.
+
+        Returns:
+            float: The temperature in Kelvin.
+        """
+        return self.to("K")
+
+    def to_rankine(self) -> float:
+        """Converts a temperature to Rankine.
+
+        Returns:
+            float: The temperature in Rankine.
+        """
+        return self.to("R")
+
+
+def _parse_fields(fields: List[bytes]) -> Tuple[list, Optional[List[bytes]]]:
+    """Parse the fields into floats, in a single pass unless some are not numbers.
+
+    Returns:
+        The values of the numeric fields, and when there are others, the text of every
+        field, None for the numeric ones.
+    """
+    with contextlib.suppress(ValueError):
+        return list(map(float, fields)), None
+    values = []
+    texts = []
+    for field in fields:
+        try:
+            values.append(float(field))
+            texts.append(None)
+        except ValueError:
+            texts.append(field.strip())
+    return values, texts
+
+
+def _parse_column(data: bytes, count: int):
+    """Parse count values, one per line, None when some of them are not numbers."""
+    np = _numpy()
+    if np is None:
+        try:
+            values = list(map(float, data.split()))
+        except ValueError:
+            return None
+    else:
+        # parsed in C, NumPy only warns about the text it could not parse
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                values = np.fromstring(data, sep=" ")
+            except (DeprecationWarning, ValueError):
+                return None
+    return values if len(values) == count else None
+
+
+def _format_fixed(values, precision: int) -> Optional[bytes]:
+    """Format a float64 NumPy array like "%.{precision}f", a value per line.
+
+    The digits are computed with integer arithmetic over the whole array and laid out
+    in a matrix of bytes, one row per value, from which the padding is dropped. The
+    values close to a rounding tie are rounded by Python, like % does.
+
+    Returns:
+        Optional[bytes]: The lines, None when a value is not finite or has too many
+            digits to be formatted exactly, which % must do instead.
+    """
+    np = _numpy()
+    if not len(values):
+        return b""
+    scaled = values * 10.0**precision
+    if not np.isfinite(scaled).all() or np.abs(scaled).max() >= 2**52:
+        return None
+    integers = np.rint(np.abs(scaled)).astype(np.int64)
+    ties = np.flatnonzero(np.abs(np.abs(scaled) % 1 - 0.5) < 1e-6)
+    spec = f"%.{precision}f"
+    for index in ties.tolist():
+        integers[index] = abs(int((spec % values[index]).replace(".", "")))
+
+    width = max(len(str(integers.max())), precision + 1)
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    digits = (integers[:, None] // powers % 10 + ord("0")).astype(np.uint8)
+    # the leading zeros are padding, but for the one before the decimal point
+    length = np.searchsorted(powers[::-1][1:], integers, side="right") + 1
+    length = np.maximum(length, precision + 1)
+    keep_digits = np.arange(width) >= (width - length)[:, None]
+
+    whole = width - precision
+    columns = [np.signbit(values)[:, None], keep_digits[:, :whole]]
+    characters = [np.full((len(values), 1), ord("-"), np.uint8), digits[:, :whole]]
+    if precision:
+        columns += [np.ones((len(values), 1), bool), keep_digits[:, whole:]]
+        characters += [np.full((len(values), 1), ord("."), np.uint8), digits[:, whole:]]
+    columns.append(np.ones((len(values), 1), bool))
+    characters.append(np.full((len(values), 1), ord("\n"), np.uint8))
+    return np.hstack(characters)[np.hstack(columns)].tobytes()
+
+
+def _format_lines(values, precision: int) -> bytes:
+    """Format the values like "%.{precision}f", a value per line."""
+    np = _numpy()
+    if np is not None and isinstance(values, np.ndarray):
+        formatted = _format_fixed(values, precision)
+        if formatted is not None:
+            return formatted
+    spec = f"%.{precision}f\n"
+    return "".join([spec % value for value in values]).encode()
+
+
+def _one_value_per_line(data: bytes) -> bool:
+    """Tell whether every line holds one value, with neither blank lines nor separators."""
+    if any(separator in data for separator in (b",", b" ", b"\t", b"\n\n", b"\n\r\n")):
+        return False
+    return not data.startswith((b"\n", b"\r\n"))
+
+
+def _convert_lines(
+    lines: List[bytes], from_unit: str, to_unit: str, precision: int
+) -> bytes:
+    """Convert every comma separated value of the lines, keeping their layout."""
+    data = b"".join(lines)
+    # one value per line, the common case, is parsed and formatted in single calls
+    if _one_value_per_line(data):
+        values = _parse_column(data, len(lines))
+        if values is not None:
+            converted = convert_batch(values, from_unit, to_unit)
+            return _format_lines(converted, precision)
+
+    rows = [line.split(b",") if line.strip() else [] for line in lines]
+    fields = [field for row in rows for field in row]
+    values, texts = _parse_fields(fields)
+    converted = convert_batch(values, from_unit, to_unit)
+    formatted = _format_lines(converted, precision).split(b"\n")
+    if texts is not None:
+        converted = iter(formatted)
+        formatted = [next(converted) if text is None else text for text in texts]
+    formatted = iter(formatted)
+    output = [b",".join(itertools.islice(formatted, len(row))) for row in rows]
+    return b"\n".join(output) + b"\n"
+
+
+def convert_stream(
+    source: BinaryIO,
+    target: BinaryIO,
+    from_unit: str,
+    to_unit: str,
+    precision: int = 2,
+    chunk_size: int = CHUNK_SIZE,
+):
+    """Convert the values of a stream chunk by chunk, writing them to another one."""
+    while lines := source.readlines(chunk_size):
+        target.write(_convert_lines(lines, from_unit, to_unit, precision))
+
+
+def _open_inputs(paths: Iterable[str]):
+    """Yield the binary streams to convert, stdin if no path is given."""
+    if not paths:
+        yield sys.stdin.buffer
+        return
+    for path in paths:
+        with open(path, "rb") as f:
+            yield f
 
 
 def parse_args() -> argparse.Namespace:
@@ -44,23 +316,40 @@ def parse_args() -> argparse.Namespace:
         argparse.Namespace: An object containing the parsed arguments.
     """
     parser = argparse.ArgumentParser(
-        description="Convert temperature from Celsius to Fahrenheit or vice versa."
+        description="Convert temperature between Celsius, Fahrenheit, Kelvin and Rankine."
     )
     parser.add_argument(
         "-t",
         "--temperature",
         type=float,
-        help="Temperature value to be converted.",
-        required=True,
+        help="Temperature value to be converted, else the values of the files or stdin.",
     )
     parser.add_argument(
         "-u",
         "--unit",
         type=str,
-        choices=["C", "F"],
-        help="Unit of temperature to be converted, either Celsius (C) or Fahrenheit (F).",
+        choices=UNITS,
+        help="Unit of temperature to be converted, Celsius (C), Fahrenheit (F), Kelvin (K) or Rankine (R).",
         required=True,
     )
+    parser.add_argument(
+        "--to",
+        type=str,
+        choices=UNITS,
+        help="Unit to convert to, Fahrenheit for Celsius and Celsius for the others by default.",
+    )
+    parser.add_argument(
+        "-p",
+        "--precision",
+        type=int,
+        default=2,
+        help="Decimals of the streamed values.",
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="Files of newline or comma separated values to stream, stdin by default.",
+    )
     try:
         return parser.parse_args()
     except SystemExit:
@@ -68,14 +357,25 @@ def parse_args() -> argparse.Namespace:
         exit()
 
 
-if __name__ == "__main__":
+def main():
+    """Main entrypoint."""
     args = parse_args()
+    to_unit = args.to or ("F" if args.unit == "C" else "C")
+
+    if args.temperature is None:
+        for source in _open_inputs(args.files):
+            convert_stream(
+                source, sys.stdout.buffer, args.unit, to_unit, args.precision
+            )
+        return
 
     temp_converter = TemperatureConverter(args.temperature, args.unit)
+    converted_temp = temp_converter.to(to_unit)
+    print(
+        f"{args.temperature:.2f}{SYMBOLS[args.unit]} = "
+        f"{converted_temp:.2f}{SYMBOLS[to_unit]}"
+    )
 
-    if args.unit == "C":
-        converted_temp = temp_converter.to_fahrenheit()
-        print(f"{args.temperature:.2f}°C = {converted_temp:.2f}°F")
-    elif args.unit == "F":
-        converted_temp = temp_converter.to_celsius()
-        print(f"{args.temperature:.2f}°F = {converted_temp:.2f}°C")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Generate a reproducible corpus of files to benchmark the file tools against.
+
+The same seed and parameters always produce a byte-identical tree: every file is
+generated by its own PRNG, seeded from the corpus seed and the file index, so the
+files can be written in parallel in any order.
+
+The tree has --depth levels of --fanout directories with --files-per-dir files each.
+The file sizes follow a log-normal distribution. Text files (.txt and .py) are lines
+of lowercase words, with the search patterns planted in a --density fraction of the
+lines. Binary files (.bin) only hold bytes above 0x7f, so the ASCII patterns are never
+found in them by accident.
+
+The manifest, written next to the tree, lists the path, size and SHA-256 of every file,
+the line and offset of every planted match, and the directories holding .py files,
+which InitPyCreator must fill. first_matches and verify_corpus check a run against it.
+"""
+import argparse
+import concurrent.futures
+import functools
+import hashlib
+import json
+import math
+import os
+import random
+import string
+from typing import Dict, List, NamedTuple, Tuple
+
+DEFAULT_PATTERNS = ("NEEDLE", "TODO:")
+EXTENSIONS = (".txt", ".py", ".bin")
+WORDS_PER_LINE = 12
+# maps every byte to one above 0x7f, for binary content without ASCII patterns
+HIGH_BYTES = bytes(byte | 0x80 for byte in range(256))
+
+
+class CorpusSpec(NamedTuple):
+    """The parameters a corpus is generated from."""
+
+    seed: int = 0
+    depth: int = 2
+    fanout: int = 4
+    files_per_dir: int = 10
+    median_size: int = 16 * 1024
+    size_sigma: float = 1.0
+    max_size: int = 1024 * 1024
+    text_ratio: float = 0.8
+    patterns: Tuple[str, ...] = DEFAULT_PATTERNS
+    density: float = 0.001
+
+
+def file_rng(seed: int, index: int, purpose: str) -> random.Random:
+    """Return a PRNG of a file, independent of the other files."""
+    return random.Random(f"{seed}:{index}:{purpose}")  # noqa: S311
+
+
+def directories(spec: CorpusSpec) -> List[str]:
+    """Return the relative directories of the tree, the root included, in order."""
+    dirs = [""]
+    level = [""]
+    for _ in range(spec.depth):
+        level = [
+            os.path.join(parent, f"d{child:02}")
+            for parent in level
+            for child in range(spec.fanout)
+        ]
+        dirs.extend(level)
+    return dirs
+
+
+def plan_files(spec: CorpusSpec) -> List[Tuple[int, str, int]]:
+    """Return the index, relative path and target size of every file."""
+    mu = math.log(spec.median_size)
+    files = []
+    for directory in directories(spec):
+        for _ in range(spec.files_per_dir):
+            index = len(files)
+            rng = file_rng(spec.seed, index, "plan")
+            if rng.random() < spec.text_ratio:
+                extension = rng.choice(EXTENSIONS[:2])
+            else:
+                extension = EXTENSIONS[2]
+            size = min(spec.max_size, int(rng.lognormvariate(mu, spec.size_sigma)))
+            path = os.path.join(directory, f"file_{index:06}{extension}")
+            files.append((index, path, size))
+    return files
+
+
+@functools.lru_cache(maxsize=4)
+def vocabulary(seed: int, size: int = 1000) -> List[str]:
+    """Return the lowercase words the text files are made of."""
+    rng = random.Random(f"{seed}:vocabulary")  # noqa: S311
+    return [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+        for _ in range(size)
+    ]
+
+
+def text_content(
+    rng: random.Random, size: int, words: List[str], spec: CorpusSpec
+) -> Tuple[bytes, List[Tuple[str, int, int]]]:
+    """Return about size bytes of text lines, and the pattern, line and offset planted."""
+    lines = []
+    planted = []
+    offset = 0
+    while offset < size:
+        line = " ".join(rng.choices(words, k=WORDS_PER_LINE))
+        if rng.random() < spec.density:
+            pattern = rng.choice(spec.patterns)
+            column = line.rfind(" ", 0, rng.randrange(len(line))) + 1
+            line = f"{line[:column]}{pattern} {line[column:]}"
+            planted.append((pattern, len(lines) + 1, offset + column))
+        lines.append(line)
+        offset += len(line) + 1
+    return "".join(f"{line}\n" for line in lines).encode("ascii"), planted
+
+
+def generate_file(root: str, spec: CorpusSpec, index: int, path: str, size: int):
+    """Write a file of the corpus and return its manifest entry."""
+    rng = file_rng(spec.seed, index, "content")
+    if path.endswith(".bin"):
+        content, planted = rng.randbytes(size).translate(HIGH_BYTES), []
+    else:
+        content, planted = text_content(rng, size, vocabulary(spec.seed), spec)
+    with open(os.path.join(root, path), "wb") as f:
+        f.write(content)
+    return {
+        "path": path,
+        "size": len(content),
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "matches": [list(match) for match in planted],
+    }
+
+
+def validate(spec: CorpusSpec):
+    """Check the patterns can not appear in the generated content by accident."""
+    # the words are lowercase letters, joined by spaces into lines
+    filler = set(string.ascii_lowercase + " \n")
+    for pattern in spec.patterns:
+        if not pattern.isascii() or not set(pattern) - filler:
+            raise ValueError(
+                f"Pattern {pattern!r} must be ASCII and not only lowercase letters, "
+                "spaces and newlines"
+            )
+
+
+def create_corpus(root: str, spec: CorpusSpec = None, workers: int = None) -> Dict:
+    """Generate the corpus of spec below root and return its manifest.
+
+    Args:
+        root (str): The directory to generate the tree in.
+        spec (CorpusSpec): The seed and the shape of the corpus, the defaults if None.
+        workers (int): Processes generating the files, the CPU count by default.
+    """
+    spec = spec or CorpusSpec()
+    validate(spec)
+    for directory in directories(spec):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    files = plan_files(spec)
+    indexes, paths, sizes = zip(*files) if files else ((), (), ())
+    generate = functools.partial(generate_file, root, spec)
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        entries = list(
+            executor.map(
+                generate, indexes, paths, sizes, chunksize=max(1, len(files) // 64)
+            )
+        )
+    init_dirs = sorted(
+        {
+            os.path.dirname(entry["path"])
+            for entry in entries
+            if entry["path"].endswith(".py")
+        }
+    )
+    return {"spec": spec._asdict(), "files": entries, "init_dirs": init_dirs}
+
+
+def manifest_path(root: str) -> str:
+    """Return the default manifest of a corpus, next to its root so it is not searched."""
+    return os.path.normpath(root) + ".manifest.json"
+
+
+def write_manifest(manifest: Dict, path: str):
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def load_manifest(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def first_matches(manifest: Dict) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """Return the line and offset of the first match of every pattern in every file.
+
+    They are what FileSearcher reports, keyed by (relative path, pattern).
+    """
+    expected = {}
+    for entry in manifest["files"]:
+        for pattern, line, offset in entry["matches"]:
+            expected.setdefault((entry["path"], pattern), (line, offset))
+    return expected
+
+
+def verify_corpus(root: str, manifest: Dict) -> List[str]:
+    """Return the files of the manifest which are missing or differ below root."""
+    mismatches = []
+    for entry in manifest["files"]:
+        try:
+            digest = hashlib.sha256()
+            with open(os.path.join(root, entry["path"]), "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    digest.update(chunk)
+            digest = digest.hexdigest()
+        except FileNotFoundError:
+            digest = None
+        if digest != entry["sha256"]:
+            mismatches.append(entry["path"])
+    return mismatches
+
+
+def main():
+    """Main entrypoint."""
+    defaults = CorpusSpec()
+    parser = argparse.ArgumentParser(
+        description="Generate a reproducible corpus of files and its manifest"
+    )
+    parser.add_argument("root", help="directory to generate the corpus in")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="PRNG seed")
+    parser.add_argument(
+        "--depth", type=int, default=defaults.depth, help="levels of directories"
+    )
+    parser.add_argument(
+        "--fanout", type=int, default=defaults.fanout, help="subdirectories per level"
+    )
+    parser.add_argument(
+        "--files-per-dir",
+        type=int,
+        default=defaults.files_per_dir,
+        help="files in every directory",
+    )
+    parser.add_argument(
+        "--median-size",
+        type=int,
+        default=defaults.median_size,
+        help="median file size in bytes",
+    )
+    parser.add_argument(
+        "--size-sigma",
+        type=float,
+        default=defaults.size_sigma,
+        help="spread of the log-normal file sizes",
+    )
+    parser.add_argument(
+        "--max-size", type=int, default=defaults.max_size, help="largest file size"
+    )
+    parser.add_argument(
+        "--text-ratio",
+        type=float,
+        default=defaults.text_ratio,
+        help="fraction of text files, the others are binary",
+    )
+    parser.add_argument(
+        "-p",
+        "--pattern",
+        dest="patterns",
+        action="append",
+        help=f"pattern planted in the text files (default: {' '.join(DEFAULT_PATTERNS)})",
+    )
+    parser.add_argument(
+        "--density",
+        type=float,
+        default=defaults.density,
+        help="fraction of the text lines holding a pattern",
+    )
+    parser.add_argument(
+        "--manifest", help="manifest path (default: <root>.manifest.json)"
+    )
+    parser.add_argument("-w", "--workers", type=int, help="processes writing files")
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check an existing corpus against its manifest instead",
+    )
+    args = parser.parse_args()
+
+    path = args.manifest or manifest_path(args.root)
+    if args.verify:
+        mismatches = verify_corpus(args.root, load_manifest(path))
+        for mismatch in mismatches:
+            print(f"{mismatch} differs from the manifest")
+        raise SystemExit(1 if mismatches else 0)
+
+    spec = CorpusSpec(
+        args.seed,
+        args.depth,
+        args.fanout,
+        args.files_per_dir,
+        args.median_size,
+        args.size_sigma,
+        args.max_size,
+        args.text_ratio,
+        tuple(args.patterns or DEFAULT_PATTERNS),
+        args.density,
+    )
+    manifest = create_corpus(args.root, spec, args.workers)
+    write_manifest(manifest, path)
+    total = sum(entry["size"] for entry in manifest["files"])
+    matches = sum(len(entry["matches"]) for entry in manifest["files"])
+    print(
+        f"Generated {len(manifest['files'])} files, {total / 1_000_000:.1f} MB "
+        f"with {matches} planted matches, manifest in {path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
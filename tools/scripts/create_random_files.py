@@ -1,10 +1,35 @@
 #!/usr/bin/env python3
-"""A simple script to generate random files."""
+"""A simple script to generate random files.
+
+The files are written in chunks from a reused buffer, so the memory does not grow
+with the file size. The content modes trade randomness for speed:
+
+- random: a fast non-cryptographic PRNG (random.randbytes),
+- urandom: the OS CSPRNG, slower,
+- zeros: a single zeroed buffer written over and over,
+- sparse: the file is only truncated to its size, no data is written.
+
+--compressibility zeroes that fraction of every random chunk, e.g. 0.5 makes files
+which compress to about half their size.
+
+--bulk is meant for millions of files: they are sharded in nested directories of at
+most --files-per-dir entries, files or subdirectories, only a bounded number of them
+are queued at once, and the progress is reported every second instead of a line per
+file. --processes generates the content in a process pool, for the CPU bound random
+modes.
+"""
 import argparse
 import concurrent.futures
 import os
+import random
 import threading
-from typing import List
+import time
+from typing import List, NamedTuple
+
+CHUNK_SIZE = 1024 * 1024
+MODES = ("random", "urandom", "zeros", "sparse")
+FILES_PER_DIR = 1000
+REPORT_INTERVAL = 1.0
 
 
 def get_filename(number: int) -> str:
@@ -16,7 +41,77 @@ def get_filename(number: int) -> str:
     return filename
 
 
-def create_file(file_number: int, size: int) -> None:
+def shard_depth(num_files: int, files_per_dir: int = FILES_PER_DIR) -> int:
+    """Get the levels of directories needed to shard files numbered up to num_files."""
+    depth = 0
+    shard = num_files // files_per_dir
+    while shard:
+        depth += 1
+        shard //= files_per_dir
+    return depth
+
+
+def get_sharded_path(
+    number: int, files_per_dir: int = FILES_PER_DIR, depth: int = None
+) -> str:
+    """Get the path of a file below nested directories of at most files_per_dir entries.
+
+    The directories are numbered like the files, e.g. 001/234/file_1234567.bin for
+    1000 files per directory. All the files of a run are at the same depth, that of
+    its last file by default, so a directory holds either files or subdirectories,
+    never both.
+    """
+    if depth is None:
+        depth = shard_depth(number, files_per_dir)
+    width = len(str(files_per_dir - 1))
+    shards = []
+    shard = number // files_per_dir
+    for _ in range(depth):
+        shards.append(f"{shard % files_per_dir:0{width}}")
+        shard //= files_per_dir
+    return os.path.join(*reversed(shards), get_filename(number))
+
+
+def write_content(
+    f,
+    size: int,
+    mode: str = "random",
+    compressibility: float = 0.0,
+    chunk_size: int = CHUNK_SIZE,
+) -> None:
+    """Write size bytes of the given content mode to a binary file, chunk by chunk."""
+    if mode == "sparse":
+        f.truncate(size)
+        return
+    if not 0.0 <= compressibility <= 1.0:
+        raise ValueError("compressibility must be between 0 and 1")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+
+    buffer = bytearray(min(size, chunk_size))
+    view = memoryview(buffer)
+    # the tail of the buffer stays zeroed, only its head is refilled per chunk
+    random_size = 0 if mode == "zeros" else round(len(buffer) * (1 - compressibility))
+    rng = random.Random()  # noqa: S311
+    remaining = size
+    while remaining:
+        length = min(remaining, len(buffer))
+        fill = min(random_size, length)
+        if mode == "urandom":
+            buffer[:fill] = os.urandom(fill)
+        elif fill:
+            buffer[:fill] = rng.randbytes(fill)
+        f.write(view[:length])
+        remaining -= length
+
+
+def create_file(
+    file_number: int,
+    size: int,
+    mode: str = "random",
+    compressibility: float = 0.0,
+    chunk_size: int = CHUNK_SIZE,
+) -> None:
     """Create a single file."""
     filename = get_filename(file_number)
     if os.path.exists(filename):
@@ -25,7 +120,7 @@ def create_file(file_number: int, size: int) -> None:
         print(f"Created {filename}")
 
     with open(filename, "wb") as f:
-        f.write(os.urandom(size))
+        write_content(f, size, mode, compressibility, chunk_size)
 
 
 def create_files_threads(num_files: int) -> None:
@@ -40,14 +135,127 @@ def create_files_threads(num_files: int) -> None:
         thread.join()
 
 
-def create_files(num_files: int, size: int) -> None:
+def create_files(
+    num_files: int,
+    size: int,
+    mode: str = "random",
+    compressibility: float = 0.0,
+    chunk_size: int = CHUNK_SIZE,
+) -> None:
     """Create files."""
     with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = [executor.submit(create_file, i + 1, size) for i in range(num_files)]
+        futures = [
+            executor.submit(create_file, i + 1, size, mode, compressibility, chunk_size)
+            for i in range(num_files)
+        ]
         for future in concurrent.futures.as_completed(futures):
             future.result()
 
 
+def format_throughput(total_bytes: int, seconds: float) -> str:
+    """Return the size written and its rate in MB/s."""
+    megabytes = total_bytes / 1_000_000
+    rate = megabytes / seconds if seconds else 0.0
+    return f"{megabytes:.1f} MB in {seconds:.2f} s ({rate:.1f} MB/s)"
+
+
+class BulkResult(NamedTuple):
+    files: int
+    bytes: int
+    seconds: float
+
+    def __str__(self):
+        """Return the files and bytes written, and their rates."""
+        rate = self.files / self.seconds if self.seconds else 0.0
+        return f"{self.files} files, {rate:.0f} files/s, " + format_throughput(
+            self.bytes, self.seconds
+        )
+
+
+def write_file(
+    path: str, size: int, mode: str, compressibility: float, chunk_size: int
+) -> int:
+    """Write a file of the bulk mode and return its size."""
+    with open(path, "wb") as f:
+        write_content(f, size, mode, compressibility, chunk_size)
+    return size
+
+
+def create_files_bulk(
+    num_files: int,
+    size: int,
+    mode: str = "random",
+    compressibility: float = 0.0,
+    chunk_size: int = CHUNK_SIZE,
+    output_dir: str = ".",
+    files_per_dir: int = FILES_PER_DIR,
+    workers: int = None,
+    processes: bool = False,
+    report_interval: float = REPORT_INTERVAL,
+) -> BulkResult:
+    """Create many files in sharded directories, reporting the throughput.
+
+    Args:
+        num_files (int): Number of files to create.
+        size (int): Size of every file.
+        mode (str): Content of the files, one of MODES.
+        compressibility (float): Fraction of every chunk left zeroed.
+        chunk_size (int): Bytes written at once.
+        output_dir (str): Root of the sharded directories.
+        files_per_dir (int): Maximum entries of a directory, at least 2.
+        workers (int): Files written concurrently, the CPU count by default.
+        processes (bool): Whether to write them in processes rather than threads.
+        report_interval (float): Seconds between two progress reports, 0 for none.
+    """
+    if files_per_dir < 2:
+        raise ValueError("files_per_dir must be at least 2")
+    depth = shard_depth(num_files, files_per_dir)
+    workers = workers or os.cpu_count() or 1
+    executor_class = (
+        concurrent.futures.ProcessPoolExecutor
+        if processes
+        else concurrent.futures.ThreadPoolExecutor
+    )
+    # a few files queued per worker keep them busy without a future per file
+    max_pending = workers * 4
+    pending = set()
+    files = total_bytes = 0
+    created_dirs = set()
+    start = last_report = time.perf_counter()
+
+    def collect(done):
+        nonlocal files, total_bytes
+        for future in done:
+            total_bytes += future.result()
+            files += 1
+
+    with executor_class(max_workers=workers) as executor:
+        for number in range(1, num_files + 1):
+            path = os.path.join(
+                output_dir, get_sharded_path(number, files_per_dir, depth)
+            )
+            directory = os.path.dirname(path)
+            if directory not in created_dirs:
+                os.makedirs(directory, exist_ok=True)
+                created_dirs.add(directory)
+            if len(pending) >= max_pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                collect(done)
+            pending.add(
+                executor.submit(
+                    write_file, path, size, mode, compressibility, chunk_size
+                )
+            )
+            now = time.perf_counter()
+            if report_interval and now - last_report >= report_interval:
+                print(BulkResult(files, total_bytes, now - start), flush=True)
+                last_report = now
+        collect(concurrent.futures.wait(pending).done)
+    return BulkResult(files, total_bytes, time.perf_counter() - start)
+
+
 def main():
     """Main entrypoint."""
     parser = argparse.ArgumentParser(
@@ -57,14 +265,73 @@ def main():
         "-n", "--num_files", type=int, help="number of files to create", required=True
     )
     parser.add_argument("-s", "--size", type=int, help="file size", default=1024 * 1024)
+    parser.add_argument(
+        "-m", "--mode", choices=MODES, default="random", help="content of the files"
+    )
+    parser.add_argument(
+        "-c",
+        "--compressibility",
+        type=float,
+        default=0.0,
+        help="fraction of every chunk left zeroed, from 0 to 1",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE, help="bytes written at once"
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="shard the files in directories and report the progress, not each file",
+    )
+    parser.add_argument(
+        "-o", "--output-dir", default=".", help="root directory of the bulk mode"
+    )
+    parser.add_argument(
+        "--files-per-dir",
+        type=int,
+        default=FILES_PER_DIR,
+        help=f"maximum entries of a directory in bulk mode, at least 2 (default: {FILES_PER_DIR})",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, help="files written concurrently in bulk mode"
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="write the files in processes rather than threads in bulk mode",
+    )
 
     try:
         args = parser.parse_args()
     except SystemExit:
         parser.print_help()
         exit()
+    if args.files_per_dir < 2:
+        parser.error("--files-per-dir must be at least 2")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
 
-    create_files(args.num_files, args.size)
+    if args.bulk:
+        result = create_files_bulk(
+            args.num_files,
+            args.size,
+            args.mode,
+            args.compressibility,
+            args.chunk_size,
+            args.output_dir,
+            args.files_per_dir,
+            args.workers,
+            args.processes,
+        )
+        print(f"Wrote {result}")
+        return
+
+    start = time.perf_counter()
+    create_files(
+        args.num_files, args.size, args.mode, args.compressibility, args.chunk_size
+    )
+    seconds = time.perf_counter() - start
+    print(f"Wrote {format_throughput(args.num_files * args.size, seconds)}")
 
 
 if __name__ == "__main__":
@@ -1,52 +1,982 @@
 #!/usr/bin/env python3
 """A simple script to find patterns in files recursively."""
 import argparse
+import contextlib
 import fnmatch
+import functools
+import mmap
 import os
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import re
+import stat
+import threading
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Set, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = CHUNK_SIZE
+# bytes of a long line reported before a match, and after its first LINE_CONTEXT bytes
+LINE_CONTEXT = 256
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+QUEUE_SIZE_PER_WORKER = 64
+INDEX_FILENAME = ".file_searcher.idx"
+# measured crossover with one bytes.find per pattern, 150 to 256 patterns on text and logs
+MULTI_PATTERN_MIN_PATTERNS = 256
+DEFAULT_BATCH_SIZE = 64
+MODES = ("thread", "process")
+
+Match = Tuple[int, int, str]
+
+
+class MultiPatternMatcher:
+    """Find the first occurrence of many byte patterns in a single regex pass.
+
+    The patterns are compiled into one regular expression shaped like their trie, so
+    that at every position the regex engine, in C, only tests the distinct next bytes
+    instead of every pattern. At a match it is the longest pattern starting there, and
+    the other patterns starting there are its prefixes. The search resumes at the
+    next byte, so overlapping patterns are found too.
+    """
+
+    # hits of patterns already found before the regex is rebuilt without them
+    REBUILD_AFTER_HITS = 64
+
+    def __init__(self, patterns: Sequence[bytes]):
+        self.patterns = list(dict.fromkeys(patterns))
+        self.prefixes = {
+            pattern: [other for other in self.patterns if pattern.startswith(other)]
+            for pattern in self.patterns
+        }
+        self.regex = self._compile(self.patterns)
+
+    @classmethod
+    def _compile(cls, patterns: Iterable[bytes]) -> Optional[re.Pattern]:
+        trie: dict = {}
+        for pattern in patterns:
+            if pattern:
+                node = trie
+                for byte in pattern:
+                    node = node.setdefault(byte, {})
+                node[None] = {}
+        return re.compile(cls._trie_regex(trie)) if trie else None
+
+    @classmethod
+    def _trie_regex(cls, node: dict) -> bytes:
+        """Return the regex source of the patterns below a node of the trie."""
+        branches = [
+            re.escape(bytes([byte])) + cls._trie_regex(child)
+            for byte, child in sorted(
+                item for item in node.items() if item[0] is not None
+            )
+        ]
+        if not branches:
+            return b""
+        if len(branches) == 1 and None not in node:
+            return branches[0]
+        group = b"(?:" + b"|".join(branches) + b")"
+        # a greedy optional group prefers the longest pattern
+        return group + b"?" if None in node else group
+
+    def search(self, buffer, wanted: Optional[Set[bytes]] = None) -> Dict[bytes, int]:
+        """Return the offset of the first occurrence of each pattern found in the buffer.
+
+        Args:
+            buffer: A bytes-like object (bytes or mmap).
+            wanted (Optional[Set[bytes]]): Stop as soon as all these patterns are found.
+        """
+        wanted = set(self.patterns) if wanted is None else wanted
+        found = {b"": 0} if b"" in self.prefixes else {}
+        regex = self.regex
+        position = wasted = 0
+
+        while regex and not wanted.issubset(found):
+            match = regex.search(buffer, position)
+            if match is None:
+                break
+            new = [p for p in self.prefixes[match.group()] if p not in found]
+            for pattern in new:
+                found[pattern] = match.start()
+            if not new:
+                wasted += 1
+                if wasted >= self.REBUILD_AFTER_HITS:
+                    regex = self._compile(p for p in self.patterns if p not in found)
+                    wasted = 0
+            position = match.start() + 1
+        return found
+
+
+def _line_bounds(buffer, start: int, end: int) -> Tuple[int, int, int]:
+    """Return the boundaries of the line which contains the bytes between start and end.
+
+    A long line is cut LINE_CONTEXT bytes around the match, so a match in a huge file
+    without newlines is not reported with the whole file.
+
+    Returns:
+        Tuple[int, int, int]: The start and the end of the line, and how many bytes it
+            could still grow by if the buffer went on, 0 once its end is known.
+    """
+    floor = max(0, start - LINE_CONTEXT)
+    line_start = buffer.rfind(b"\n", floor, start) + 1 or floor
+    ceiling = min(end, start + LINE_CONTEXT) + LINE_CONTEXT
+    line_end = buffer.find(b"\n", end, ceiling)
+    if line_end != -1:
+        return line_start, line_end, 0
+    line_end = min(ceiling, len(buffer))
+    return line_start, line_end, ceiling - line_end
+
+
+def _count_lines(buffer, start: int, end: int) -> int:
+    """Count newlines between start and end, slicing in chunks as mmap has no count method."""
+    count = 0
+    for position in range(start, end, CHUNK_SIZE):
+        stop = min(position + CHUNK_SIZE, end)
+        count += buffer[position:stop].count(b"\n")
+    return count
+
+
+def _decode_line(line: bytes) -> str:
+    """Decode a single matching line for reporting."""
+    return line.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_regex(pattern: bytes) -> re.Pattern:
+    """Compile a bytes regular expression once per process."""
+    return re.compile(pattern, re.MULTILINE)
+
+
+def _find_spans(
+    buffer,
+    needles: Sequence[bytes],
+    matcher: Optional[MultiPatternMatcher],
+    regex: bool,
+) -> Dict[bytes, Tuple[int, int]]:
+    """Return the start and end offsets of the first match of every needle found."""
+    if regex:
+        matches = {needle: _compile_regex(needle).search(buffer) for needle in needles}
+        return {needle: m.span() for needle, m in matches.items() if m}
+    if matcher:
+        offsets = matcher.search(buffer, set(needles))
+        offsets = {needle: offsets[needle] for needle in needles if needle in offsets}
+    else:
+        offsets = {needle: buffer.find(needle) for needle in needles}
+    return {
+        needle: (offset, offset + len(needle))
+        for needle, offset in offsets.items()
+        if offset != -1
+    }
+
+
+def _search_buffer_raw(
+    buffer,
+    needles: Sequence[bytes],
+    matcher: Optional[MultiPatternMatcher] = None,
+    regex: bool = False,
+) -> Dict[bytes, Tuple[int, int, bytes, int]]:
+    """Search for needles in a buffer, returning the matching lines undecoded.
+
+    The lines come with how many bytes they could still grow by, see _line_bounds.
+    """
+    spans = _find_spans(buffer, needles, matcher, regex)
+
+    results = {}
+    line_number, counted = 1, 0
+    for needle, (start, end) in sorted(spans.items(), key=lambda item: item[1]):
+        line_number += _count_lines(buffer, counted, start)
+        counted = start
+        line_start, line_end, more = _line_bounds(buffer, start, end)
+        results[needle] = start, line_number, buffer[line_start:line_end], more
+    return results
+
+
+def search_buffer_all(
+    buffer,
+    needles: Sequence[bytes],
+    matcher: Optional[MultiPatternMatcher] = None,
+    regex: bool = False,
+) -> Dict[bytes, Match]:
+    """Search for many needles in a bytes-like object (bytes or mmap) at once.
+
+    Args:
+        buffer: A bytes-like object supporting find, rfind and slicing.
+        needles (Sequence[bytes]): The byte sequences to look for.
+        matcher (Optional[MultiPatternMatcher]): A matcher built from the needles, used for
+            big pattern sets instead of one bytes.find call per needle.
+        regex (bool): Treat the needles as bytes regular expressions.
+
+    Returns:
+        Dict[bytes, Match]: The byte offset, the 1-based line number and the decoded
+            matching line of the first match of every needle found, at most
+            LINE_CONTEXT bytes around the match for long lines.
+    """
+    return {
+        needle: (offset, line_number, _decode_line(line))
+        for needle, (offset, line_number, line, _) in _search_buffer_raw(
+            buffer, needles, matcher, regex
+        ).items()
+    }
+
+
+def search_buffer(buffer, needle: bytes) -> Optional[Match]:
+    """Search for a needle in a bytes-like object (bytes or mmap).
+
+    Args:
+        buffer: A bytes-like object supporting find, rfind and slicing.
+        needle (bytes): The byte sequence to look for.
+
+    Returns:
+        Optional[Match]: The byte offset, the 1-based line number and the decoded
+            matching line of the first match, or None if there is no match.
+    """
+    return search_buffer_all(buffer, [needle]).get(needle)
+
+
+def search_stream_all(
+    stream: BinaryIO,
+    needles: Sequence[bytes],
+    chunk_size: int = CHUNK_SIZE,
+    matcher: Optional[MultiPatternMatcher] = None,
+    regex: bool = False,
+) -> Dict[bytes, Match]:
+    """Search for many needles in a binary stream read in fixed-size chunks.
+
+    The unfinished last line of every chunk is carried over to the next one, so matches
+    spanning chunk boundaries are found and the matching line can be reported, cut
+    like search_buffer_all does. If that line grows beyond the chunk size, only the
+    last bytes which could still be the start of a match, and the context reported
+    before it, are kept. Reading stops once every needle has been found. Regular
+    expressions spanning lines are only matched within a single chunk.
+
+    Args:
+        stream (BinaryIO): A file object opened in binary mode.
+        needles (Sequence[bytes]): The byte sequences to look for.
+        chunk_size (int): Number of bytes to read at once.
+        matcher (Optional[MultiPatternMatcher]): Same as search_buffer_all.
+        regex (bool): Same as search_buffer_all.
+
+    Returns:
+        Dict[bytes, Match]: Same as search_buffer_all.
+    """
+    remaining = list(dict.fromkeys(needles))
+    overlap = max((len(needle) for needle in remaining), default=1) - 1
+    results: Dict[bytes, Tuple[int, int, bytes]] = {}
+    # the matching lines whose end is in the next chunks, with how much they may grow
+    unfinished: Dict[bytes, int] = {}
+    carry = b""
+    carry_offset = 0
+    lines_before = 0
+
+    while (remaining or unfinished) and (chunk := stream.read(chunk_size)):
+        for needle, more in list(unfinished.items()):
+            offset, line_number, line = results[needle]
+            head, newline, _ = chunk.partition(b"\n")
+            results[needle] = offset, line_number, line + head[:more]
+            if newline or len(head) >= more:
+                del unfinished[needle]
+            else:
+                unfinished[needle] = more - len(head)
+
+        buffer = carry + chunk
+        found = {}
+        if remaining:
+            found = _search_buffer_raw(buffer, remaining, matcher, regex)
+        for needle, (offset, line_number, line, more) in found.items():
+            results[needle] = carry_offset + offset, lines_before + line_number, line
+            remaining.remove(needle)
+            if more:
+                unfinished[needle] = more
+
+        cut = buffer.rfind(b"\n") + 1
+        if len(buffer) - cut > chunk_size:
+            cut = max(cut, len(buffer) - overlap - LINE_CONTEXT)
+        lines_before += buffer.count(b"\n", 0, cut)
+        carry_offset += cut
+        carry = buffer[cut:]
+
+    return {
+        needle: (offset, line_number, _decode_line(line))
+        for needle, (offset, line_number, line) in results.items()
+    }
+
+
+def search_stream(
+    stream: BinaryIO, needle: bytes, chunk_size: int = CHUNK_SIZE
+) -> Optional[Match]:
+    """Search for a needle in a binary stream read in fixed-size chunks.
+
+    Args:
+        stream (BinaryIO): A file object opened in binary mode.
+        needle (bytes): The byte sequence to look for.
+        chunk_size (int): Number of bytes to read at once.
+
+    Returns:
+        Optional[Match]: Same as search_buffer.
+    """
+    return search_stream_all(stream, [needle], chunk_size).get(needle)
+
+
+class TrigramIndex:
+    """A persistent SQLite index of the byte trigrams of every file below a root directory.
+
+    The index only narrows down the candidate files, every candidate still has to be
+    verified by scanning it. Only the files matching the searched name are indexed, and
+    binary files are not: they are always candidates. Trigrams spanning whitespace are
+    neither indexed nor queried, so that a file is split into its distinct words at C
+    speed before its trigrams are extracted.
+
+    Extracting trigrams is much slower than scanning, so files are re-indexed only by
+    update. A search scans the files changed since they were indexed directly.
+    """
+
+    MAX_INDEXED_SIZE = 64 * 1024 * 1024
+    MAX_QUERY_TRIGRAMS = 500
+    BINARY_SNIFF_SIZE = 8192
+    WHITESPACE = frozenset(b" \t\n\r\x0b\x0c")
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            indexed INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS trigrams (
+            trigram INTEGER NOT NULL,
+            file_id INTEGER NOT NULL,
+            PRIMARY KEY (trigram, file_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS trigrams_file_id ON trigrams (file_id);
+    """
+
+    def __init__(self, root_dir: str, index_path: Optional[str] = None):
+        self.root_dir = root_dir
+        self.index_path = index_path or os.path.join(root_dir, INDEX_FILENAME)
+        import sqlite3  # only needed with an index, imported lazily for fast startup
+
+        self.connection = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.connection.executescript(self.SCHEMA)
+
+    def __len__(self):
+        """Return the number of files in the index."""
+        return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    @classmethod
+    def trigrams(cls, data: bytes) -> Set[int]:
+        """Return the distinct byte trigrams of the words of the data encoded as integers."""
+        words = b" ".join(set(data.split()))
+        windows = zip(range(len(words) - 2), range(3, len(words) + 1))
+        unique = {words[start:stop] for start, stop in windows}
+        return {
+            int.from_bytes(trigram, "big")
+            for trigram in unique
+            if cls.WHITESPACE.isdisjoint(trigram)
+        }
+
+    def _known(self) -> Dict[str, Tuple[int, int, int]]:
+        """Return the id, mtime and size of the indexed files by relative path."""
+        return {
+            path: (file_id, mtime_ns, size)
+            for file_id, path, mtime_ns, size in self.connection.execute(
+                "SELECT id, path, mtime_ns, size FROM files"
+            )
+        }
+
+    def _files(self, filename: str) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """Yield the relative path, path and stat of the regular files matching filename."""
+        index_path = os.path.abspath(self.index_path)
+        for dirpath, _, filenames in os.walk(self.root_dir):
+            for name in fnmatch.filter(filenames, filename):
+                file_path = os.path.join(dirpath, name)
+                if os.path.abspath(file_path).startswith(index_path):
+                    continue
+                try:
+                    file_stat = os.stat(file_path)
+                except OSError:
+                    continue
+                if stat.S_ISREG(file_stat.st_mode):
+                    yield os.path.relpath(
+                        file_path, self.root_dir
+                    ), file_path, file_stat
+
+    def update(self, filename: str = "*") -> int:
+        """Bring the index of the files matching filename up to date with the tree.
+
+        Returns:
+            int: The number of files which were (re-)indexed or removed.
+        """
+        known = self._known()
+        seen = set()
+        changes = 0
+
+        with self.connection:
+            for rel_path, file_path, file_stat in self._files(filename):
+                seen.add(rel_path)
+                file_id, *signature = known.get(rel_path, (None, None, None))
+                if signature == [file_stat.st_mtime_ns, file_stat.st_size]:
+                    continue
+                self._index_file(file_id, rel_path, file_path, file_stat)
+                changes += 1
+
+            for rel_path in known.keys() - seen:
+                if fnmatch.fnmatch(os.path.basename(rel_path), filename):
+                    self._remove_file(known[rel_path][0])
+                    changes += 1
+        return changes
+
+    def changes(self, filename: str = "*") -> Tuple[List[str], Set[str]]:
+        """Compare the files matching filename with the index, without reading them.
+
+        Returns:
+            Tuple[List[str], Set[str]]: The paths of the files new or changed since they
+                were indexed, and the relative paths of all the files present.
+        """
+        known = self._known()
+        changed = []
+        present = set()
+        for rel_path, file_path, file_stat in self._files(filename):
+            present.add(rel_path)
+            signature = known.get(rel_path, (None, None, None))[1:]
+            if signature != (file_stat.st_mtime_ns, file_stat.st_size):
+                changed.append(file_path)
+        return changed, present
+
+    def _index_file(
+        self,
+        file_id: Optional[int],
+        rel_path: str,
+        file_path: str,
+        file_stat: os.stat_result,
+    ):
+        """Store the trigrams of a single file, replacing any previous entry."""
+        indexed = file_stat.st_size <= self.MAX_INDEXED_SIZE
+        trigrams: Set[int] = set()
+        if indexed:
+            try:
+                with open(file_path, "rb") as file:
+                    data = file.read()
+            except OSError:
+                data = b"\0"
+            # a NUL byte marks binary files, which stay candidates of every search
+            indexed = b"\0" not in data[: self.BINARY_SNIFF_SIZE]
+            if indexed:
+                trigrams = self.trigrams(data)
+
+        if file_id is not None:
+            self._remove_file(file_id)
+        cursor = self.connection.execute(
+            "INSERT INTO files (path, mtime_ns, size, indexed) VALUES (?, ?, ?, ?)",
+            (rel_path, file_stat.st_mtime_ns, file_stat.st_size, indexed),
+        )
+        self.connection.executemany(
+            "INSERT INTO trigrams (trigram, file_id) VALUES (?, ?)",
+            ((trigram, cursor.lastrowid) for trigram in trigrams),
+        )
+
+    def _remove_file(self, file_id: int):
+        """Drop a file and its trigrams from the index."""
+        self.connection.execute("DELETE FROM trigrams WHERE file_id = ?", (file_id,))
+        self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def candidates(self, needle: bytes) -> List[str]:
+        """Return paths of files which may contain the needle.
+
+        Files too big to be indexed and binary files are always candidates, as are all
+        files when the needle has no trigram outside whitespace.
+        """
+        trigrams = sorted(self.trigrams(needle))[: self.MAX_QUERY_TRIGRAMS]
+        if not trigrams:
+            rows = self.connection.execute("SELECT path FROM files")
+        else:
+            placeholders = ", ".join("?" * len(trigrams))
+            rows = self.connection.execute(
+                f"""
+                SELECT path FROM files WHERE NOT indexed
+                UNION
+                SELECT files.path FROM trigrams JOIN files ON files.id = trigrams.file_id
+                WHERE trigrams.trigram IN ({placeholders})
+                GROUP BY trigrams.file_id HAVING COUNT(*) = ?
+                """,  # noqa: S608
+                (*trigrams, len(trigrams)),
+            )
+        return [os.path.join(self.root_dir, path) for path, in rows]
+
+    def close(self):
+        """Close the underlying database connection."""
+        self.connection.close()
+
+
+class SearchResult(NamedTuple):
+    """A single pattern found in a file."""
+
+    path: str
+    modified_time: datetime
+    line_number: int
+    offset: int
+    line: str
+    pattern: str
+
+
+@functools.lru_cache(maxsize=8)
+def _worker_searcher(patterns: Tuple[str, ...], regex: bool) -> "FileSearcher":
+    """Build a searcher once per worker process, compiling its patterns only once."""
+    return FileSearcher("*", patterns, ".", regex=regex)
+
+
+def _scan_batch(
+    patterns: Tuple[str, ...], regex: bool, paths: List[str]
+) -> List[Tuple[str, Dict[bytes, Match], Optional[str]]]:
+    """Scan a batch of files in a worker process.
+
+    Returns:
+        List[Tuple[str, Dict[bytes, Match], Optional[str]]]: The path, the matches and
+            the error message for every file of the batch.
+    """
+    searcher = _worker_searcher(patterns, regex)
+    results = []
+    for path in paths:
+        try:
+            results.append((path, searcher.find_in_file(path), None))
+        except OSError as e:
+            results.append((path, {}, str(e)))
+    return results
 
 
 class FileSearcher:
     """A class to search for patterns in the file names provided."""
 
-    def __init__(self, filename: str, pattern: str, root_dir: str):
+    def __init__(
+        self,
+        filename: str,
+        pattern: str | Sequence[str],
+        root_dir: str,
+        workers: int = DEFAULT_WORKERS,
+        index: Optional[TrigramIndex] = None,
+        update_index: bool = False,
+        check_changes: bool = True,
+        regex: bool = False,
+        mode: str = "thread",
+        processes: Optional[int] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        ordered: bool = False,
+    ):
         self.filename = filename
         self.pattern = pattern
         self.root_dir = root_dir
+        self.workers = workers
+        self.index = index
+        self.update_index = update_index
+        self.check_changes = check_changes
+        self.regex = regex
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode}, expected one of {MODES}")
+        self.mode = mode
+        self.processes = processes or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.ordered = ordered
+        self.patterns = [pattern] if isinstance(pattern, str) else list(pattern)
+        self.needles = list(dict.fromkeys(p.encode("utf-8") for p in self.patterns))
+        self.matcher = None
+        if regex:
+            for needle in self.needles:
+                _compile_regex(needle)
+        elif len(self.needles) >= MULTI_PATTERN_MIN_PATTERNS:
+            self.matcher = MultiPatternMatcher(self.needles)
+        self._tasks: queue.Queue = queue.Queue()
+        self._scan_file: Callable[[str], None] = self.check_file_content
+        self._lock = threading.Lock()
+        self._batch: List[str] = []
+        self._batches_submitted = 0
+        self._next_batch = 0
+        self._finished_batches: Dict[int, list] = {}
+        self._in_flight = threading.BoundedSemaphore(self.processes * 2)
+        self._processes = None
+        self._results: queue.Queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def find_in_file(self, file_path: str) -> Dict[bytes, Match]:
+        """Find the first occurrence of every pattern in the file in a single read.
+
+        Regular files bigger than MMAP_THRESHOLD are memory mapped, so the content is never
+        copied into Python objects. Small files, pipes and special files are read in chunks.
+        Big pattern sets are matched in one pass of a MultiPatternMatcher, small ones with
+        one bytes.find call per pattern, which is faster while the set is small.
+        """
+        with open(file_path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < MMAP_THRESHOLD:
+                return search_stream_all(
+                    file, self.needles, matcher=self.matcher, regex=self.regex
+                )
+            try:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return search_buffer_all(
+                        mapped, self.needles, self.matcher, self.regex
+                    )
+            except (OSError, ValueError):
+                return search_stream_all(
+                    file, self.needles, matcher=self.matcher, regex=self.regex
+                )
 
     def check_file_content(self, file_path: str):
-        """Search for a pattern in the file."""
-        with open(file_path) as file:
-            for line in file:
-                if self.pattern in line:
-                    modified_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    print(f"{file_path} last modified at {modified_time}")
+        """Search for the patterns in the file and emit the matches found."""
+        if self._cancelled.is_set():
+            return
+        try:
+            found = self.find_in_file(file_path)
+        except OSError as e:
+            print(f"Unable to read {file_path}: {e}")
+            return
+        self._emit(file_path, found)
+
+    def _emit(self, file_path: str, found: Dict[bytes, Match]):
+        """Pass the matches of a file, ordered by offset, to the consumer of search."""
+        if not found or self._cancelled.is_set():
+            return
+        modified_time = datetime.fromtimestamp(os.path.getmtime(file_path))
+        matches = sorted(found.items(), key=lambda item: item[1][0])
+        self._results.put(
+            [
+                SearchResult(
+                    file_path,
+                    modified_time,
+                    line_number,
+                    offset,
+                    line,
+                    needle.decode("utf-8"),
+                )
+                for needle, (offset, line_number, line) in matches
+            ]
+        )
+
+    def scan_directory(self, dir_path: str):
+        """List a directory and schedule its subdirectories and matching files."""
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    if self._cancelled.is_set():
+                        break
+                    if entry.is_dir(follow_symlinks=False):
+                        self._schedule(self.scan_directory, entry.path)
+                    elif entry.is_file() and fnmatch.fnmatch(entry.name, self.filename):
+                        self._schedule(self._scan_file, entry.path)
+        except OSError as e:
+            print(f"Unable to list {dir_path}: {e}")
+
+    def _schedule(self, func: Callable[[str], None], path: str):
+        """Put a task on the shared queue or run it in place when the queue is full.
+
+        Running the task on the calling worker is the backpressure mechanism: the queue
+        never grows beyond its bound, and workers cannot deadlock waiting on each other.
+        """
+        try:
+            self._tasks.put_nowait((func, path))
+        except queue.Full:
+            func(path)
+
+    def _worker(self):
+        """Process tasks from the shared queue until a sentinel is received."""
+        while (task := self._tasks.get()) is not None:
+            func, path = task
+            try:
+                if not self._cancelled.is_set():
+                    func(path)
+            except Exception as exc:
+                print(f"Error processing {path}: {exc}")
+            finally:
+                self._tasks.task_done()
+        self._tasks.task_done()
+
+    def _add_to_batch(self, file_path: str):
+        """Collect a file into the current batch, submitting the batch once it is full."""
+        if self._cancelled.is_set():
+            return
+        with self._lock:
+            self._batch.append(file_path)
+            if len(self._batch) < self.batch_size:
+                return
+        self._submit_batch()
+
+    def _submit_batch(self):
+        """Send the current batch to the process pool, waiting while too many are queued."""
+        with self._lock:
+            batch, self._batch = self._batch, []
+            if not batch:
+                return
+            sequence = self._batches_submitted
+            self._batches_submitted += 1
+        self._in_flight.acquire()
+        future = self._processes.submit(
+            _scan_batch, tuple(self.patterns), self.regex, batch
+        )
+        future.add_done_callback(functools.partial(self._batch_done, sequence))
+
+    def _batch_done(self, sequence: int, future: Future):
+        """Report a finished batch, holding it back until preceding batches if ordered."""
+        self._in_flight.release()
+        results = []
+        if not future.cancelled():
+            try:
+                results = future.result()
+            except Exception as exc:
+                print(f"Error processing batch: {exc}")
+
+        with self._lock:
+            if not self.ordered:
+                ready = [results]
+            else:
+                self._finished_batches[sequence] = results
+                ready = []
+                while self._next_batch in self._finished_batches:
+                    ready.append(self._finished_batches.pop(self._next_batch))
+                    self._next_batch += 1
+            for file_path, found, error in (item for batch in ready for item in batch):
+                if error:
+                    print(f"Unable to read {file_path}: {error}")
+                else:
+                    self._emit(file_path, found)
+
+    def search_index(self):
+        """Scan only the candidate files returned by the trigram index.
+
+        The files changed since they were indexed, e.g. growing logs, are scanned
+        directly rather than re-indexed, which is much slower than scanning them. The
+        index is updated first only with update_index, or while it is still empty.
+        With check_changes=False the index is trusted as is, without walking the tree.
+        """
+        changed, present = [], None
+        if self.update_index or not len(self.index):
+            self.index.update(self.filename)
+        elif self.check_changes:
+            changed, present = self.index.changes(self.filename)
+        needles = [b""] if self.regex else self.needles
+        candidates = dict.fromkeys(
+            path
+            for needle in needles
+            for path in self.index.candidates(needle)
+            if fnmatch.fnmatch(os.path.basename(path), self.filename)
+            and (present is None or os.path.relpath(path, self.root_dir) in present)
+        )
+        candidates.update(dict.fromkeys(changed))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for path in candidates:
+                if self._cancelled.is_set():
                     break
+                executor.submit(self._scan_file, path)
 
-    def search_files(self):
-        """Scan through all files starting from root dir."""
-        with ThreadPoolExecutor() as executor:
-            for entry in os.scandir(self.root_dir):
-                if entry.is_file() and fnmatch.fnmatch(entry.name, self.filename):
-                    executor.submit(self.check_file_content, entry.path)
-                elif entry.is_dir():
-                    subdir_searcher = FileSearcher(
-                        self.filename, self.pattern, entry.path
-                    )
-                    subdir_searcher.search_files()
+    def search(self, max_results: Optional[int] = None) -> Iterator[SearchResult]:
+        """Lazily yield the matches found starting from root dir.
+
+        The search runs in the background while the results are consumed. Once
+        max_results matches were yielded, or the iterator is closed or garbage collected
+        early, pending work and the directory walk are cancelled.
+
+        Args:
+            max_results (Optional[int]): Stop after this many matches.
+
+        Yields:
+            SearchResult: One record per pattern found in a file, grouped by file.
+        """
+        self._cancelled.clear()
+        self._error = None
+        self._results = queue.Queue(maxsize=self.workers * QUEUE_SIZE_PER_WORKER)
+        producer = threading.Thread(target=self._produce, daemon=True)
+        producer.start()
+
+        count = 0
+        try:
+            while (matches := self._results.get()) is not None:
+                for match in matches:
+                    yield match
+                    count += 1
+                    if max_results is not None and count >= max_results:
+                        return
+            if self._error:
+                raise self._error
+        finally:
+            self.cancel()
+            while producer.is_alive():
+                with contextlib.suppress(queue.Empty):
+                    self._results.get(timeout=0.01)
+
+    def cancel(self):
+        """Stop the running search as soon as possible."""
+        self._cancelled.set()
+
+    def search_files(self, max_results: Optional[int] = None):
+        """Scan through all files starting from root dir and print the matches."""
+        current_path = None
+        for match in self.search(max_results):
+            if match.path != current_path:
+                current_path = match.path
+                print(f"{match.path} last modified at {match.modified_time}")
+            line_number = match.line_number
+            if len(self.needles) > 1:
+                line_number = f"{line_number} [{match.pattern}]"
+            print(f"  {line_number}: {match.line}")
+
+    def _produce(self):
+        """Run the search, putting the matches of every file on the results queue.
+
+        A single pool of workers shares one bounded queue, which holds both directories
+        to list and files to scan, so directory listing runs in parallel as well.
+        In process mode the workers only list directories, files are sent in batches
+        to a pool of processes so that CPU bound regex matching is not limited by the GIL.
+        """
+        try:
+            if self.mode == "thread":
+                self._scan_file = self.check_file_content
+                self._walk()
+            else:
+                self._produce_with_processes()
+        except Exception as exc:
+            self._error = exc
+        finally:
+            self._results.put(None)
+
+    def _produce_with_processes(self):
+        """Walk the tree, sending files to scan to a pool of processes."""
+        self._scan_file = self._add_to_batch
+        self._in_flight = threading.BoundedSemaphore(self.processes * 2)
+        self._batches_submitted = self._next_batch = 0
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.processes, mp_context=context) as processes:
+            self._processes = processes
+            self._walk()
+            self._submit_batch()
+            processes.shutdown(cancel_futures=self._cancelled.is_set())
+
+    def _walk(self):
+        """Feed the files to scan to self._scan_file, from the index or the directory tree."""
+        if self.index is not None:
+            self.search_index()
+            return
+
+        self._tasks = queue.Queue(maxsize=self.workers * QUEUE_SIZE_PER_WORKER)
+        self._tasks.put((self.scan_directory, self.root_dir))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for _ in range(self.workers):
+                executor.submit(self._worker)
+            self._tasks.join()
+            for _ in range(self.workers):
+                self._tasks.put(None)
 
 
 def main():
     """Program entrypoint."""
     parser = argparse.ArgumentParser()
     parser.add_argument("filename", help="name of the file to search for")
-    parser.add_argument("pattern", help="name of the pattern to search for")
+    parser.add_argument("pattern", nargs="?", help="name of the pattern to search for")
     parser.add_argument("root_dir", help="root directory to start search from")
+    parser.add_argument(
+        "-e",
+        "--pattern",
+        dest="patterns",
+        action="append",
+        default=[],
+        help="additional pattern to search for, can be repeated",
+    )
+    parser.add_argument(
+        "-f",
+        "--patterns-file",
+        help="file with one pattern per line to search for",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="number of threads listing directories and scanning files",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="narrow down the files to scan with a persistent trigram index",
+    )
+    parser.add_argument(
+        "--index-file",
+        help=f"path of the trigram index, defaults to {INDEX_FILENAME} in the root dir",
+    )
+    parser.add_argument(
+        "--no-update",
+        action="store_true",
+        help="query the index as is, without checking the tree for changed files",
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="re-index the files changed since the last indexing before searching",
+    )
+    parser.add_argument(
+        "--regex",
+        action="store_true",
+        help="treat the patterns as regular expressions",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=MODES,
+        default="thread",
+        help="scan files in threads or, for CPU bound regex matching, in processes",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="number of processes in process mode, defaults to the number of CPUs",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="number of files sent to a process at once in process mode",
+    )
+    parser.add_argument(
+        "--ordered",
+        action="store_true",
+        help="in process mode report batches in the order they were submitted",
+    )
+    parser.add_argument(
+        "-m",
+        "--max-results",
+        type=int,
+        help="stop searching after this many matches",
+    )
     args = parser.parse_args()
 
-    searcher = FileSearcher(args.filename, args.pattern, args.root_dir)
-    searcher.search_files()
+    patterns = ([args.pattern] if args.pattern else []) + args.patterns
+    if args.patterns_file:
+        with open(args.patterns_file) as patterns_file:
+            patterns.extend(line.rstrip("\n") for line in patterns_file if line.strip())
+    if not patterns:
+        parser.error("provide a pattern, -e/--pattern or -f/--patterns-file")
+
+    index = None
+    if args.index:
+        index = TrigramIndex(args.root_dir, args.index_file)
+
+    try:
+        searcher = FileSearcher(
+            args.filename,
+            patterns,
+            args.root_dir,
+            workers=args.workers,
+            index=index,
+            update_index=args.reindex,
+            check_changes=not args.no_update,
+            regex=args.regex,
+            mode=args.mode,
+            processes=args.processes,
+            batch_size=args.batch_size,
+            ordered=args.ordered,
+        )
+    except re.error as e:
+        parser.error(f"invalid regular expression: {e}")
+    searcher.search_files(max_results=args.max_results)
 
 
 if __name__ == "__main__":
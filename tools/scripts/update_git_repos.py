@@ -10,14 +10,19 @@ Requirements to run the script:
 - git-up extension , to be installed via `pip install git-up`
 """
 import argparse
+import csv
+import hashlib
+import json
 import logging
 import os
 import shlex
+import shutil
 import subprocess
+import threading
 import time
-from dataclasses import dataclass
-
-import pkg_resources
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
 
 
 @dataclass
@@ -61,6 +66,25 @@ class ColoredLogger(logging.Logger):
         add_handler(error_color_handler, formatter_error, logging.ERROR)
 
 
+@dataclass
+class TimingSpan:
+    """Duration of a single command run in a repository."""
+
+    repo: str
+    command: str
+    duration: float
+    succeeded: bool
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Return the nearest-rank percentile of the values, 0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
 logging.setLoggerClass(ColoredLogger)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -72,67 +96,317 @@ class GitRepositoryUpdater:
     GIT_DIR = ".git"
     PATHS_TO_EXCLUDE = (".terraform",)
     REQUIRED_DEPENDENCY = "git-up"
-
-    def __init__(self, path: str = ".", keywords: list = None):
+    COMMANDS = ("git up", "git fetch origin --prune")
+    REMOTE_STATE_COMMAND = "git ls-remote origin"
+
+    def __init__(
+        self,
+        path: str = ".",
+        keywords: list = None,
+        nested: bool = False,
+        submodules: bool = False,
+        cache_file: Optional[str] = None,
+        state_file: Optional[str] = None,
+    ):
         self._is_package_installed(self.REQUIRED_DEPENDENCY)
+        self.nested = nested
+        self.submodules = submodules
+        self.cache_file = cache_file
+        self.state_file = state_file
+        self.remote_states = self._load_remote_states()
         self.repos = self.find_git_repos(path, keywords)
+        self.timings: List[TimingSpan] = []
+        self._log_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    @staticmethod
+    def _cache_dir() -> str:
+        """Return the directory holding the caches of the script."""
+        cache_dir = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+        return os.path.join(cache_dir, "update_git_repos")
+
+    @staticmethod
+    def default_cache_file(path: str, nested: bool, submodules: bool) -> str:
+        """Return the cache file used for a root path and discovery options."""
+        key = json.dumps([os.path.abspath(path), nested, submodules])
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(GitRepositoryUpdater._cache_dir(), f"{digest}.json")
+
+    @staticmethod
+    def default_state_file() -> str:
+        """Return the file storing the last seen remote state of every repository."""
+        return os.path.join(GitRepositoryUpdater._cache_dir(), "remote_states.json")
 
     def find_git_repos(self, path: str, keywords: list = None):
-        """Discover all Git repositories full paths."""
+        """Discover all Git repositories full paths.
+
+        The repository list is cached together with the mtime of every directory
+        which was listed. As long as none of them changed, no repository could have
+        been added or removed, and the walk is skipped.
+        """
+        repos = self._load_cache(path)
+        if repos is None:
+            repos, dir_mtimes = self._discover_git_repos(path)
+            self._save_cache(path, repos, dir_mtimes)
+        return [repo for repo in repos if self._is_keyword_matching(repo, keywords)]
+
+    def _discover_git_repos(self, path: str) -> Tuple[List[str], Dict[str, int]]:
+        """Walk the tree, pruning Git directories, excluded paths and found repositories.
+
+        A .git file marks a submodule or a worktree. These are only reported when
+        submodules is set, and they are never descended into otherwise. The working
+        tree of a repository is only descended into when nested is set.
+
+        Returns:
+            Tuple[List[str], Dict[str, int]]: The repositories found and the mtime of
+                every directory listed during the walk.
+        """
         repos = []
+        dir_mtimes = {}
+
+        for root, dirs, files in os.walk(path):
+            try:
+                dir_mtimes[root] = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
+            has_git_dir = self.GIT_DIR in dirs
+            dirs[:] = [
+                d for d in dirs if d != self.GIT_DIR and d not in self.PATHS_TO_EXCLUDE
+            ]
+            if self.GIT_DIR in files and not self.submodules:
+                dirs[:] = []
+                continue
+            if has_git_dir or self.GIT_DIR in files:
+                repos.append(os.path.join(root, ""))
+                if not self.nested:
+                    dirs[:] = []
+        return repos, dir_mtimes
+
+    def _load_cache(self, path: str) -> Optional[List[str]]:
+        """Return the cached repositories, or None when the cache is missing or stale."""
+        if not self.cache_file:
+            return None
+        try:
+            with open(self.cache_file) as cache:
+                data = json.load(cache)
+            if data["path"] != path:
+                return None
+            for dir_path, mtime in data["dirs"].items():
+                if os.stat(dir_path).st_mtime_ns != mtime:
+                    return None
+        except (OSError, ValueError, KeyError):
+            return None
+        return data["repos"]
+
+    def _save_cache(self, path: str, repos: List[str], dir_mtimes: Dict[str, int]):
+        """Store the repositories found along with the directory mtimes."""
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(self.cache_file, "w") as cache:
+                json.dump({"path": path, "repos": repos, "dirs": dir_mtimes}, cache)
+        except OSError as e:
+            logger.warning(f"Unable to write repositories cache {self.cache_file}: {e}")
 
-        for root, dirs, _ in os.walk(path):
-            if self.GIT_DIR in dirs:
-                matching = self._is_keyword_matching(root, keywords)
-                if matching:
-                    repos.append(matching)
-        return repos
-
-    def _is_keyword_matching(self, root: str, keywords: list):
+    def _is_keyword_matching(self, repo_dir: str, keywords: list) -> bool:
         """Helper method to check whether keyword is matching the repository path name."""
-        repo_path = os.path.join(root, self.GIT_DIR)
-        if keywords is None or any(keyword in repo_path for keyword in keywords):
-            if any(path in repo_path for path in self.PATHS_TO_EXCLUDE):
-                logger.warning(
-                    f"Path {repo_path} is skipped as it contains reserved keyword."
-                )
-                return None
-            return repo_path.strip(self.GIT_DIR)
-        return None
+        repo_path = os.path.join(repo_dir, self.GIT_DIR)
+        return keywords is None or any(keyword in repo_path for keyword in keywords)
 
-    def _run_command(self, command: str, repo_dir: str):
-        """Run a command inside repository."""
-        logger.info(f'Running "{command}" in {repo_dir}')
+    def _run_command(
+        self, command: str, repo_dir: str, messages: List[Tuple[int, str]]
+    ) -> bool:
+        """Run a command inside repository, collecting log messages instead of logging them.
 
+        Returns:
+            bool: Whether the command succeeded.
+        """
+        messages.append((logging.INFO, f'Running "{command}" in {repo_dir}'))
+
+        start_time = time.perf_counter()
         try:
             args = shlex.split(command)
             output = subprocess.check_output(
-                args, shell=False, stderr=subprocess.STDOUT  # noqa: S603
+                args, cwd=repo_dir, shell=False, stderr=subprocess.STDOUT  # noqa: S603
             )
             if output:
-                logger.info(f"Command output: {output}")
+                messages.append((logging.INFO, f"Command output: {output}"))
         except subprocess.CalledProcessError as e:
-            logger.error(f'Error running "{command}": {e.output.decode("utf-8")}')
-            return
+            error = e.output.decode("utf-8", errors="replace")
+            messages.append((logging.ERROR, f'Error running "{command}": {error}'))
+            self._record_timing(repo_dir, command, start_time, False)
+            return False
+        except OSError as e:
+            messages.append((logging.ERROR, f'Error running "{command}": {e}'))
+            self._record_timing(repo_dir, command, start_time, False)
+            return False
+        self._record_timing(repo_dir, command, start_time, True)
+        return True
+
+    def _record_timing(
+        self, repo_dir: str, command: str, start_time: float, succeeded: bool
+    ):
+        """Record how long a command took in a repository."""
+        duration = time.perf_counter() - start_time
+        with self._log_lock:
+            self.timings.append(TimingSpan(repo_dir, command, duration, succeeded))
+
+    def _log_messages(self, messages: List[Tuple[int, str]]):
+        """Log all messages of a repository at once, so they do not interleave."""
+        with self._log_lock:
+            for level, message in messages:
+                logger.log(level, message)
 
     def _is_package_installed(self, package: str):
-        package_list = {pkg.key for pkg in pkg_resources.working_set}
-        if package in package_list:
-            return True
-        else:
-            raise ValueError(
-                f"Package {package} is not absent. Install via pip install"
-            )
-
-    def fetch_git_remote(self, repo_dir: str):
-        """Fetch remote Git repository data."""
-        logger.info(f"Entering Git directory: {repo_dir}")
-        os.chdir(repo_dir)
+        """Check the executable of the package, which git runs as a subcommand, is on PATH.
 
-        self._run_command("git up", repo_dir)
-        self._run_command("git fetch origin --prune", repo_dir)
+        Looking it up on PATH is much cheaper than scanning all installed distributions.
+        """
+        if shutil.which(package):
+            return True
+        raise ValueError(
+            f"Package {package} is absent. Install via pip install {package}"
+        )
 
-        logger.info(f"Finished updating {repo_dir}")
+    def _load_remote_states(self) -> Dict[str, str]:
+        """Load the last seen remote state of every repository from the state file."""
+        if not self.state_file:
+            return {}
+        try:
+            with open(self.state_file) as state:
+                return json.load(state)
+        except (OSError, ValueError):
+            return {}
+
+    def save_remote_states(self):
+        """Store the last seen remote state of every repository in the state file."""
+        if not self.state_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            with open(self.state_file, "w") as state:
+                json.dump(self.remote_states, state, indent=2, sort_keys=True)
+        except OSError as e:
+            logger.warning(f"Unable to write remote states {self.state_file}: {e}")
+
+    def get_remote_state(self, repo_dir: str) -> Optional[str]:
+        """Return a digest of all refs of the remote, None if it cannot be listed.
+
+        Listing the remote refs is a single cheap round trip compared to updating.
+        """
+        start_time = time.perf_counter()
+        try:
+            output = subprocess.check_output(
+                shlex.split(self.REMOTE_STATE_COMMAND),
+                cwd=repo_dir,
+                shell=False,  # noqa: S603
+                stderr=subprocess.DEVNULL,
+            )
+        except (subprocess.CalledProcessError, OSError):
+            self._record_timing(repo_dir, self.REMOTE_STATE_COMMAND, start_time, False)
+            return None
+        self._record_timing(repo_dir, self.REMOTE_STATE_COMMAND, start_time, True)
+        return hashlib.sha256(output).hexdigest()
+
+    def fetch_git_remote(self, repo_dir: str) -> bool:
+        """Fetch remote Git repository data.
+
+        With a state file, the update is skipped when the remote refs did not change
+        since the last successful update.
+
+        Returns:
+            bool: Whether all commands succeeded.
+        """
+        messages = [(logging.INFO, f"Entering Git directory: {repo_dir}")]
+
+        remote_state = None
+        if self.state_file:
+            remote_state = self.get_remote_state(repo_dir)
+            if remote_state and remote_state == self.remote_states.get(repo_dir):
+                messages.append((logging.INFO, f"Remote unchanged, skipped {repo_dir}"))
+                self._log_messages(messages)
+                return True
+
+        results = [self._run_command(cmd, repo_dir, messages) for cmd in self.COMMANDS]
+
+        if remote_state and all(results):
+            with self._state_lock:
+                self.remote_states[repo_dir] = remote_state
+        messages.append((logging.INFO, f"Finished updating {repo_dir}"))
+        self._log_messages(messages)
+        return all(results)
+
+    def sync(self, jobs: int = 1) -> List[str]:
+        """Update all repositories, running up to jobs of them at the same time.
+
+        A failure in one repository does not stop the others from being updated.
+
+        Returns:
+            List[str]: The repositories which failed to update.
+        """
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(self.fetch_git_remote, self.repos))
+        self.save_remote_states()
+        return [repo for repo, succeeded in zip(self.repos, results) if not succeeded]
+
+    def repo_durations(self) -> Dict[str, float]:
+        """Return the total time spent in every repository, slowest first."""
+        durations: Dict[str, float] = {}
+        for span in self.timings:
+            durations[span.repo] = durations.get(span.repo, 0.0) + span.duration
+        return dict(sorted(durations.items(), key=lambda item: item[1], reverse=True))
+
+    def timing_summary(self, slowest: int = 10) -> dict:
+        """Summarize the timings per command with percentiles and the slowest repos."""
+        commands: Dict[str, List[float]] = {}
+        for span in self.timings:
+            commands.setdefault(span.command, []).append(span.duration)
+        return {
+            "commands": {
+                command: {
+                    "count": len(durations),
+                    "total": sum(durations),
+                    "p50": percentile(durations, 50),
+                    "p90": percentile(durations, 90),
+                    "p99": percentile(durations, 99),
+                    "max": max(durations),
+                }
+                for command, durations in commands.items()
+            },
+            "slowest": [
+                {"repo": repo, "duration": duration}
+                for repo, duration in list(self.repo_durations().items())[:slowest]
+            ],
+        }
+
+    def write_report(self, report_file: str, slowest: int = 10):
+        """Write the timing spans to a CSV file, or to JSON along with the summary."""
+        with open(report_file, "w", newline="") as report:
+            if report_file.endswith(".csv"):
+                writer = csv.DictWriter(
+                    report, fieldnames=list(TimingSpan.__annotations__)
+                )
+                writer.writeheader()
+                writer.writerows(asdict(span) for span in self.timings)
+            else:
+                data = self.timing_summary(slowest)
+                data["spans"] = [asdict(span) for span in self.timings]
+                json.dump(data, report, indent=2)
+
+    def log_timing_summary(self, slowest: int = 10):
+        """Log a compact table of the command percentiles and the slowest repos."""
+        summary = self.timing_summary(slowest)
+        logger.info(
+            f"{'command':<30} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"
+        )
+        for command, stats in summary["commands"].items():
+            logger.info(
+                f"{command:<30} {stats['count']:>6} {stats['p50']:>7.2f}s "
+                f"{stats['p90']:>7.2f}s {stats['p99']:>7.2f}s {stats['max']:>7.2f}s"
+            )
+        for item in summary["slowest"]:
+            logger.info(f"{item['duration']:>8.2f}s {item['repo']}")
 
 
 class CommandParser:
@@ -163,6 +437,43 @@ class CommandParser:
         parser.add_argument(
             "--log", action="store_true", default=False, help="Enable logging to a file"
         )
+        parser.add_argument(
+            "--nested",
+            action="store_true",
+            help="Look for repositories nested inside other repositories.",
+        )
+        parser.add_argument(
+            "--submodules",
+            action="store_true",
+            help="Include submodules and worktrees, marked by a .git file.",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Always walk the tree instead of using the cached repository list.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only update repositories whose remote refs changed since the last run.",
+        )
+        parser.add_argument(
+            "--report",
+            help="Write per repository and command timings to a .json or .csv file.",
+        )
+        parser.add_argument(
+            "--slowest",
+            type=int,
+            default=10,
+            help="Number of slowest repositories to show in the timing summary.",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of repositories to update in parallel.",
+        )
 
         args = parser.parse_args()
 
@@ -177,7 +488,7 @@ def log_processing_time(start_time: float):
 
     if hours == 0 and minutes == 0:
         message = f"Total processing time {seconds:.2f} seconds"
-    elif minutes == 0:
+    elif hours > 0:
         message = f"Total processing time {int(hours)} hours, {int(minutes)} minutes and {seconds:.2f} seconds"
     else:
         message = (
@@ -191,18 +502,39 @@ def sync_git_repos(parser):
     """Sync Git remote repositories with a local copy."""
     full_path = os.path.abspath(parser.path)
 
-    updater = GitRepositoryUpdater(path=full_path, keywords=parser.keywords)
+    cache_file = None
+    if not parser.no_cache:
+        cache_file = GitRepositoryUpdater.default_cache_file(
+            full_path, parser.nested, parser.submodules
+        )
+
+    state_file = None
+    if parser.incremental:
+        state_file = GitRepositoryUpdater.default_state_file()
+
+    updater = GitRepositoryUpdater(
+        path=full_path,
+        keywords=parser.keywords,
+        nested=parser.nested,
+        submodules=parser.submodules,
+        cache_file=cache_file,
+        state_file=state_file,
+    )
     if not updater.repos:
         logger.warning("No Git repositories found to be synced with Git remote.")
     else:
         logger.info("Start syncing Git repositories.")
-        for repo_dir in updater.repos:
-            updater.fetch_git_remote(repo_dir)
+        failed = updater.sync(jobs=parser.jobs)
+        if failed:
+            logger.error(f"Failed to update {len(failed)} repositories: {failed}")
+        updater.log_timing_summary(parser.slowest)
+        if parser.report:
+            updater.write_report(parser.report, parser.slowest)
+            logger.info(f"Timing report written to {parser.report}")
 
 
 def main():
     """Main program."""
-    script_dir = os.getcwd()
     start_time = time.time()
 
     parser = CommandParser()
@@ -210,7 +542,6 @@ def main():
         logger.info("Logging to file enabled")
 
     sync_git_repos(parser)
-    os.chdir(script_dir)
     log_processing_time(start_time)
 
 